@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""Benchmarks for journal.py."""
+
+from argparse import ArgumentParser, Namespace
+from collections import defaultdict
+from datetime import datetime, timedelta
+from importlib.util import spec_from_file_location, module_from_spec
+from json import dumps as json_to_str
+from os import close, dup, dup2, devnull, open as open_fd, O_WRONLY
+from pathlib import Path
+from random import Random
+from sys import modules, stdout
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from tracemalloc import start as start_tracing, stop as stop_tracing, get_traced_memory
+from types import ModuleType
+from typing import Any, Callable, Optional
+
+BenchmarkFunction = Callable[[ModuleType, Namespace], dict[str, float]]
+BENCHMARKS = {} # type: dict[str, BenchmarkFunction]
+WORDS = (
+    'the quick brown fox jumps over the lazy dog while an apple a banana and a cherry '
+    'wait for the e-mail about health-care and well-being'
+).split()
+OPERATIONS = {
+    'index': ['-I'],
+    'index-incremental': ['-I'],
+    'show': ['-S'],
+    'list': ['-L'],
+    'list-terms': ['-L', 'fox', 'dog'],
+    'count-day': ['-C', '--unit', 'day'],
+    'graph': ['-G'],
+    'wording': ['-W', 'health', 'care'],
+    'vimgrep': ['--vimgrep', 'cherry'],
+}
+
+
+def load_journal(path=None, name='journal'):
+    # type: (Optional[Path], str) -> ModuleType
+    """Load journal.py as a module.
+
+    Parameters:
+        path: The path of journal.py. Defaults to the one next to this file.
+        name: The name of the module. Defaults to "journal".
+
+    Returns:
+        ModuleType: The journal module.
+    """
+    if path is None:
+        path = Path(__file__).resolve().parent / 'journal.py'
+    spec = spec_from_file_location(name, path)
+    module = module_from_spec(spec)
+    # register the module so the process pool can pickle its functions
+    modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_journal(directory, args):
+    # type: (Path, Namespace) -> None
+    """Write a deterministic synthetic journal with one file per year.
+
+    Parameters:
+        directory: The directory of the journal.
+        args: The journal parameters: years, entries_per_day, words_per_entry,
+            refs_per_entry, and seed.
+    """
+
+    def _count(mean):
+        # type: (float) -> int
+        return int(mean) + (rng.random() < mean % 1)
+
+    rng = Random(args.seed)
+    date = datetime(2000, 1, 1)
+    end_date = datetime(2000 + args.years, 1, 1)
+    files = {} # type: dict[str, list[str]]
+    dates = [] # type: list[datetime]
+    num_notes = 0
+    while date < end_date:
+        for index in range(_count(args.entries_per_day)):
+            if index == 0:
+                title = date.strftime('%Y-%m-%d, %A')
+                filename = date.strftime('%Y')
+            else:
+                num_notes += 1
+                title = f'note {num_notes}'
+                filename = 'notes'
+            words = rng.choices(WORDS, k=rng.randint(1, 2 * args.words_per_entry - 1))
+            for _ in range(_count(args.refs_per_entry) if dates else 0):
+                reference = rng.choice(dates[-1000:]).strftime('%Y-%m-%d')
+                words.insert(rng.randrange(len(words) + 1), reference)
+            lines = [title]
+            for start in range(0, len(words), 30):
+                lines.append('\t' + ' '.join(words[start:start + 30]))
+            files.setdefault(filename, []).append('\n'.join(lines))
+            if index == 0:
+                dates.append(date)
+        date += timedelta(days=1)
+    for filename, entries in files.items():
+        (directory / f'{filename}.journal').write_text('\n\n'.join(entries) + '\n')
+
+
+def register(function):
+    # type: (BenchmarkFunction) -> BenchmarkFunction
+    """Register a benchmark.
+
+    Parameters:
+        function: The benchmark function.
+
+    Returns:
+        BenchmarkFunction: The benchmark function.
+    """
+    assert function.__name__.startswith('bench_')
+    BENCHMARKS[function.__name__[len('bench_'):].replace('_', '-')] = function
+    return function
+
+
+@register
+def bench_lint_errors(journal, args):
+    # type: (ModuleType, Namespace) -> dict[str, float]
+    """Lint a synthetic journal with 150k errors.
+
+    With --baseline, the baseline journal.py is also timed, and must find the
+    same errors.
+
+    Parameters:
+        journal: The journal module.
+        args: The parsed arguments.
+
+    Returns:
+        dict[str, float]: The timings.
+    """
+    lines = []
+    for _ in range(50000):
+        lines.extend(['2020-01-01, Wednesday', '\tsome  words here ', ''])
+    lines.pop()
+    results = {} # type: dict[str, float]
+    with TemporaryDirectory() as temp_dir:
+        directory = Path(temp_dir)
+        (directory / '2020.journal').write_text('\n'.join(lines) + '\n')
+        errors = None
+        for label, module in (('lint_s', journal), ('baseline_lint_s', args.baseline_journal)):
+            if module is None:
+                continue
+            entries = module.Journal(directory, use_cache=False)
+            start = perf_counter()
+            module_errors = entries.lint()
+            results[label] = perf_counter() - start
+            # 100k from the file and 50k duplicate titles, less the first
+            assert len(module_errors) == 149999
+            assert errors is None or module_errors == errors
+            errors = module_errors
+    return results
+
+
+@register
+def bench_chain_components(journal, _):
+    # type: (ModuleType, Namespace) -> dict[str, float]
+    """Find the connected components of a reference chain.
+
+    The components of a 50k-node chain are found with DisjointSets. The
+    parent-dict loop that do_graph used before is quadratic on chains, so it
+    is only run on the first 5k nodes.
+
+    Parameters:
+        journal: The journal module.
+
+    Returns:
+        dict[str, float]: The timings, and the number of nodes of each chain.
+    """
+    size = 50000
+    parent_dict_size = 5000
+    start = perf_counter()
+    parents = {index: index for index in range(parent_dict_size)}
+    for src in range(1, parent_dict_size):
+        dest = src - 1
+        while parents[dest] != src:
+            parents[dest], dest = src, parents[dest]
+    components = defaultdict(set) # type: dict[int, set[int]]
+    for rep in parents:
+        path = set([rep])
+        while parents[rep] != rep:
+            path.add(rep)
+            rep = parents[rep]
+        components[rep] |= path
+    parent_dict_time = perf_counter() - start
+    start = perf_counter()
+    disjoint_sets = journal.DisjointSets(size)
+    for index in range(1, size):
+        disjoint_sets.union(index, index - 1)
+    union_time = perf_counter() - start
+    start = perf_counter()
+    assert len(set(disjoint_sets.find(index) for index in range(size))) == 1
+    find_time = perf_counter() - start
+    assert len(components) == 1
+    return {
+        'parent_dict_nodes': parent_dict_size,
+        'parent_dict_s': parent_dict_time,
+        'disjoint_sets_nodes': size,
+        'union_s': union_time,
+        'find_s': find_time,
+    }
+
+
+@register
+def bench_titles(journal, args):
+    # type: (ModuleType, Namespace) -> dict[str, float]
+    """Construct and sort 1M titles, mostly dates with some words.
+
+    With --baseline, the baseline Title is also timed on the same titles, and
+    must sort them in the same order.
+
+    Parameters:
+        journal: The journal module.
+        args: The parsed arguments.
+
+    Returns:
+        dict[str, float]: The timings.
+    """
+    first = journal.datetime(1900, 1, 1).toordinal()
+    strings = []
+    for index in range(1000000):
+        if index % 10 == 0:
+            strings.append(f'topic {index}')
+        else:
+            strings.append(journal.datetime.fromordinal(first + index).strftime('%Y-%m-%d, %A'))
+    results = {} # type: dict[str, float]
+    order = None
+    for prefix, module in (('', journal), ('baseline_', args.baseline_journal)):
+        if module is None:
+            continue
+        start = perf_counter()
+        titles = [module.Title(string) for string in strings]
+        results[f'{prefix}construct_s'] = perf_counter() - start
+        start = perf_counter()
+        titles.sort(reverse=True)
+        results[f'{prefix}sort_s'] = perf_counter() - start
+        assert sum(title.is_date for title in titles) == 900000
+        module_order = [title.title for title in titles]
+        assert order is None or module_order == order
+        order = module_order
+    return results
+
+
+@register
+def bench_entry_store(journal, args):
+    # type: (ModuleType, Namespace) -> dict[str, float]
+    """Load a synthetic journal from its cache and read every entry.
+
+    With --baseline, the baseline journal.py is also measured, on its own
+    copy of the journal, and must read the same text.
+
+    Parameters:
+        journal: The journal module.
+        args: The journal parameters.
+
+    Returns:
+        dict[str, float]: The timings and the peak traced memory.
+    """
+    results = {} # type: dict[str, float]
+    num_chars = None
+    for prefix, module in (('', journal), ('baseline_', args.baseline_journal)):
+        if module is None:
+            continue
+        with TemporaryDirectory() as temp_dir:
+            directory = Path(temp_dir)
+            write_journal(directory, args)
+            # the baseline writes its cache from the entries it has read
+            module.Journal(directory, use_cache=False).update_metadata()
+            start_tracing()
+            start = perf_counter()
+            entries = module.Journal(directory)
+            module_chars = sum(len(entries[title].text) for title in entries)
+            results[f'{prefix}load_s'] = perf_counter() - start
+            results[f'{prefix}peak_mib'] = get_traced_memory()[1] / 2**20
+            stop_tracing()
+        assert module_chars > 0
+        assert num_chars is None or module_chars == num_chars
+        num_chars = module_chars
+    return results
+
+
+@register
+def bench_operations(journal, args):
+    # type: (ModuleType, Namespace) -> dict[str, float]
+    """Time the cache load and each operation on a synthetic journal.
+
+    Each operation loads the journal from its cache and runs twice, once for
+    the wall time and once under tracemalloc for the peak memory. Output is
+    discarded. Before each run, index deletes the metadata files, so it
+    rebuilds them from scratch, and index-incremental edits the last year.
+
+    Parameters:
+        journal: The journal module.
+        args: The journal parameters.
+
+    Returns:
+        dict[str, float]: The wall time and peak memory of each operation.
+    """
+
+    def _measure(label, function, setup=None):
+        # type: (str, Callable[[], Any], Optional[Callable[[], None]]) -> None
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        function()
+        results[f'{label} wall_s'] = perf_counter() - start
+        if setup is not None:
+            setup()
+        start_tracing()
+        function()
+        results[f'{label} peak_mib'] = get_traced_memory()[1] / 2**20
+        stop_tracing()
+
+    def _remove_metadata():
+        # type: () -> None
+        for metadata_file in metadata_files:
+            metadata_file.unlink(missing_ok=True)
+
+    def _edit_last_year():
+        # type: () -> None
+        with last_year_file.open('a') as fd:
+            fd.write('\tedited\n')
+
+    def _run_operation(op_args):
+        # type: (Namespace) -> None
+        # like the CLI, only load the cache for -I, so it is only updated once
+        entries = journal.Journal(
+            directory,
+            auto_update=(op_args.operation.__name__ != 'do_index'),
+        )
+        stdout.flush()
+        saved_fd = dup(stdout.fileno())
+        null_fd = open_fd(devnull, O_WRONLY)
+        dup2(null_fd, stdout.fileno())
+        try:
+            journal.run_operation(arg_parser, op_args, entries)
+            stdout.flush()
+        finally:
+            dup2(saved_fd, stdout.fileno())
+            close(saved_fd)
+            close(null_fd)
+
+    results = {} # type: dict[str, float]
+    arg_parser = journal.build_arg_parser(ArgumentParser())
+    with TemporaryDirectory() as temp_dir:
+        directory = Path(temp_dir)
+        write_journal(directory, args)
+        loaded = journal.Journal(directory)
+        metadata_files = (loaded.tags_file, loaded.cache_file, loaded.index_file, loaded.refs_file)
+        last_year_file = directory / f'{2000 + args.years - 1}.journal'
+        setups = {
+            'index': _remove_metadata,
+            'index-incremental': _edit_last_year,
+        }
+        _measure('cache-load', lambda: journal.Journal(directory))
+        for label, cli_args in OPERATIONS.items():
+            op_args = journal.process_args(
+                arg_parser,
+                arg_parser.parse_args([*cli_args, '--directory', temp_dir, '--no-log']),
+            )
+            _measure(label, lambda op_args=op_args: _run_operation(op_args), setups.get(label))
+    return results
+
+
+def main():
+    # type: () -> None
+    """Provide a CLI entry point."""
+    arg_parser = ArgumentParser(
+        description='Benchmarks for journal.py. Prints the best result of each key as JSON.',
+    )
+    arg_parser.add_argument(
+        'benchmarks',
+        metavar='BENCHMARK',
+        nargs='*',
+        help=f'benchmarks to run; one or more of {", ".join(BENCHMARKS)} (default: all)',
+    )
+    arg_parser.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        help='number of times to run each benchmark (default: %(default)s)',
+    )
+    arg_parser.add_argument(
+        '--baseline',
+        type=Path,
+        help='another journal.py to compare against, such as from an older checkout',
+    )
+    group = arg_parser.add_argument_group('SYNTHETIC JOURNAL OPTIONS')
+    group.add_argument(
+        '--years',
+        type=int,
+        default=20,
+        help='number of years of entries (default: %(default)s)',
+    )
+    group.add_argument(
+        '--entries-per-day',
+        type=float,
+        default=1.0,
+        help='mean number of entries per day, beyond the first as notes (default: %(default)s)',
+    )
+    group.add_argument(
+        '--words-per-entry',
+        type=int,
+        default=40,
+        help='mean number of words per entry (default: %(default)s)',
+    )
+    group.add_argument(
+        '--refs-per-entry',
+        type=float,
+        default=0.3,
+        help='mean number of date references per entry (default: %(default)s)',
+    )
+    group.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='random seed (default: %(default)s)',
+    )
+    args = arg_parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            arg_parser.error(f'unknown benchmark "{name}"')
+    journal = load_journal()
+    args.baseline_journal = None
+    if args.baseline:
+        args.baseline_journal = load_journal(args.baseline.resolve(), 'journal_baseline')
+    report = {} # type: dict[str, dict[str, float]]
+    for name in (args.benchmarks or BENCHMARKS.keys()):
+        results = [BENCHMARKS[name](journal, args) for _ in range(args.repeat)]
+        report[name] = {key: round(min(result[key] for result in results), 3) for key in results[0]}
+    print(json_to_str(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
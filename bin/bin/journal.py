@@ -2,54 +2,143 @@
 """Command line tool for viewing and maintaining a journal."""
 
 import re
-from json import load as json_read, dump as json_write
+from array import array
+from json import dumps as json_to_str, loads as json_from_str
 from argparse import ArgumentParser, Namespace
+from bisect import bisect_left, bisect_right
 from calendar import monthrange
 from collections import namedtuple, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from copy import copy
+from cProfile import Profile
 from datetime import datetime, timedelta
-from inspect import currentframe
-from itertools import chain, groupby
-from os import chdir as cd, chmod, environ, execvp, fork, wait
+from errno import EIO
+from hashlib import sha256
+from io import BytesIO, RawIOBase
+from itertools import chain, groupby, islice
+from mmap import mmap, ACCESS_READ
+from os import chdir as cd, chmod, close, dup2, environ, execvp, fork, wait, waitpid
+from os import replace, sendfile, umask, waitstatus_to_exitcode, write as write_fd
+from os import _exit as exit_process, cpu_count, urandom, WNOHANG
 from pathlib import Path
 from stat import S_IRUSR
+from struct import Struct
+from selectors import DefaultSelector, EVENT_READ
+from signal import signal, set_wakeup_fd, SIGCHLD
+from socket import socket, socketpair, AF_UNIX, SOCK_STREAM, send_fds, recv_fds
 from statistics import mean, median, stdev
-from subprocess import run
-from sys import stdout, exit as sys_exit
-from tarfile import open as open_tar_file, TarInfo
+from shutil import which
+from subprocess import CalledProcessError, Popen, PIPE
+from sys import argv, stderr, stdout, exit as sys_exit
+from tarfile import open as open_tar_file, TarError, TarFile, TarInfo
 from tempfile import mkstemp
-from typing import Any, Optional, Union, Callable, Generator, Iterable, Sequence, Mapping
+from time import monotonic, perf_counter
+from traceback import print_exc
+from typing import Any, Optional, Union, Callable, Generator, Iterable, Iterator, Sequence, Mapping
+from typing import IO, BinaryIO, Literal, TypeVar
+
+try:
+    import numpy as np
+except (ModuleNotFoundError, ImportError):
+    np = None
 
 FILE_EXTENSION = '.journal'
+SOCKET_FILENAME = '.socket'
+ARCHIVE_MANIFEST_FILENAME = '.archive'
+PROFILE_ENV_VAR = 'JOURNAL_PROFILE'
+PROFILE_PHASES = ('arguments', 'load', 'filter', 'operation', 'output')
+SERVED_OPERATIONS = ('do_count', 'do_graph', 'do_list', 'do_show', 'do_vimgrep')
+# the total size of changed journal files worth parsing in parallel
+PARALLEL_MIN_SIZE = 1 << 20
+CACHE_MAGIC = b'JRNL'
+CACHE_VERSION = 7
+# magic, version, generation, number of entries, manifest length; the index and the reference
+# graph are only used if their generation matches the cache
+CACHE_HEADER = Struct('<4sI8sIQ')
+# file ID, line number, title length, text offset, text length, followed by EntryStats
+CACHE_RECORD = Struct('<IIIQI' + 7 * 'I')
+INDEX_MAGIC = b'JRNW'
+# magic, version, generation, number of entries, vocabulary length
+INDEX_HEADER = Struct('<4sI8sIQ')
+REFS_MAGIC = b'JRNR'
+# magic, version, generation, number of entries, number of edges, followed by arrays of the
+# number of references, the edge offsets, the edges, the date offsets, and the referenced dates
+REFS_HEADER = Struct('<4sI8sIQ')
 STRING_LENGTHS = {
     'year': 4,
     'month': 7,
     'day': 10,
 }
 DATE_LENGTH = STRING_LENGTHS['day']
+DATE_SUFFIXES = frozenset(
+    ['']
+    + [f', {day}day' for day in ('Mon', 'Tues', 'Wednes', 'Thurs', 'Fri', 'Satur', 'Sun')]
+)
 
 REFERENCE_REGEX = re.compile('[0-9]{4}-[0-9]{2}-[0-9]{2}')
 DATE_REGEX = re.compile(REFERENCE_REGEX.pattern + '(, (Mon|Tues|Wednes|Thurs|Fri|Satur|Sun)day)?')
 RANGE_BOUND_REGEX = re.compile('([0-9]{4}(-[0-9]{2}(-[0-9]{2})?)?)?')
+WORD_REGEX = re.compile(r'\w+')
+NON_ALNUM_REGEX = re.compile('[^ 0-9A-Za-z]')
+REGEX_META_REGEX = re.compile(r'[.^$*+?{}\[\]\\|()]')
+WORD_PART_REGEX = re.compile("[a-z']+", flags=re.IGNORECASE)
 
 
 class Title:
     """A utility class for handling date and non-date titles."""
 
+    __slots__ = ('title', 'is_date', 'ordinal', '_key', '_date')
+
     def __init__(self, title):
         # type: (str) -> None
         """Initialize a new Title."""
         self.title = title
-        self.is_date = bool(DATE_REGEX.fullmatch(self.title))
-        self._date = None # type: datetime
-        self._iso = None # type: str
+        self.ordinal = Title._parse_ordinal(title)
+        self.is_date = self.ordinal is not None
+        # titles are compared by their ISO form, so date and word titles can be mixed
+        self._key = title[:DATE_LENGTH] if self.is_date else title
+        self._date = None # type: Optional[datetime]
+
+    @staticmethod
+    def _parse_ordinal(title):
+        # type: (str) -> Optional[int]
+        """Parse a date title by fixed offsets.
+
+        Parameters:
+            title: The title.
+
+        Returns:
+            Optional[int]: The proleptic Gregorian ordinal of the date, or None
+                if the title is not a valid date.
+        """
+        if not (
+            len(title) >= DATE_LENGTH
+            and title[4] == '-'
+            and title[7] == '-'
+            and title[DATE_LENGTH:] in DATE_SUFFIXES
+        ):
+            return None
+        try:
+            return datetime.fromisoformat(title[:DATE_LENGTH]).toordinal()
+        except ValueError:
+            return None
 
     @property
     def date(self):
         # type: () -> datetime
-        """Get the date represented by the title."""
-        assert self.is_date
+        """Get the date represented by the title.
+
+        Returns:
+            datetime: The date.
+
+        Raises:
+            ValueError: If the title is not a valid date.
+        """
+        if self.ordinal is None:
+            raise ValueError(f'title is not a date: {self.title}')
         if self._date is None:
-            self._date = datetime.strptime(self.title[:DATE_LENGTH], '%Y-%m-%d')
+            self._date = datetime.fromordinal(self.ordinal)
         return self._date
 
     def iso(self, unit='day', default=None):
@@ -63,29 +152,26 @@ class Title:
         Returns:
             str: An ISO-formatted date string, up to the specified unit.
         """
-        if self._iso is None:
-            if self.is_date:
-                self._iso = self.date.strftime('%Y-%m-%d')[:STRING_LENGTHS['day']]
-            else:
-                self._iso = self.title
         if self.is_date:
-            return self._iso[:STRING_LENGTHS[unit]]
+            return self._key[:STRING_LENGTHS[unit]]
         elif default is not None:
             return default
         else:
-            return self._iso
+            return self._key
 
     def __lt__(self, other):
         # type: (Title) -> bool
-        return self.iso() < other.iso()
+        return self._key < other._key
 
     def __eq__(self, other):
         # type: (Any) -> bool
-        return self.iso() == other.iso()
+        if not isinstance(other, Title):
+            return NotImplemented
+        return self._key == other._key
 
     def __hash__(self):
         # type: () -> int
-        return hash(self.iso())
+        return hash(self._key)
 
     def __str__(self):
         # type: () -> str
@@ -93,21 +179,832 @@ class Title:
 
 
 Entry = namedtuple('Entry', 'title, text, filepath, line_num')
+EntryStats = namedtuple(
+    'EntryStats',
+    'num_chars, num_words, num_plain_words, num_letters, num_sentences, max_line_len, num_refs',
+)
+NodeStats = namedtuple('NodeStats', 'num_words, num_refs, num_cites')
 Entries = Mapping[Title, Entry]
+EntryValue = TypeVar('EntryValue')
+MapResult = TypeVar('MapResult')
+FileRecord = dict[str, Any]
+# the errors of a journal file, and the title and line number of each entry
+FileLint = tuple[list[tuple[int, str]], list[tuple[str, int]]]
+# the per-entry fields of a file record, which are not stored in the cache manifest
+ENTRY_FIELDS = ('entries', 'stats', 'words', 'dates')
 DateRange = tuple[Optional[datetime], Optional[datetime]]
 
 
+class MappedEntries(Entries):
+    """Entries backed by a memory-mapped cache file.
+
+    The cache index is kept as parallel arrays of file IDs, line numbers, and
+    text offsets and lengths. Entries are decoded from the mapped text blob
+    each time they are accessed.
+    """
+
+    def __init__(self, cache_fd, cache_map, blob_offset, filepaths):
+        # type: (BinaryIO, mmap, int, list[Path]) -> None
+        """Initialize the entries.
+
+        Parameters:
+            cache_fd: The open cache file.
+            cache_map: The memory-mapped cache file.
+            blob_offset: The offset of the text blob in the cache file.
+            filepaths: The journal files, by file ID.
+        """
+        self.cache_fd = cache_fd
+        self.cache_map = cache_map
+        _, _, self.generation, num_entries, _ = CACHE_HEADER.unpack_from(cache_map)
+        self.use_sendfile = True
+        # the cache index immediately follows the header
+        self.index_offset = CACHE_HEADER.size
+        self.blob_offset = blob_offset
+        self.filepaths = filepaths
+        self.file_ids = array('I')
+        self.line_nums = array('I')
+        self.offsets = array('Q')
+        self.lengths = array('I')
+        self.titles = [] # type: list[Title]
+        self.positions = {} # type: dict[Title, int]
+        index_end = self.index_offset + num_entries * CACHE_RECORD.size
+        records = CACHE_RECORD.iter_unpack(cache_map[self.index_offset:index_end])
+        for position, (file_id, line_num, title_len, offset, length, *_) in enumerate(records):
+            start = blob_offset + offset
+            title = Title(cache_map[start:start + title_len].decode('utf-8'))
+            self.file_ids.append(file_id)
+            self.line_nums.append(line_num)
+            self.offsets.append(offset)
+            self.lengths.append(length)
+            self.titles.append(title)
+            self.positions[title] = position
+
+    def __len__(self):
+        # type: () -> int
+        return len(self.titles)
+
+    def __iter__(self):
+        # type: () -> Generator[Title, None, None]
+        yield from self.titles
+
+    def __getitem__(self, key):
+        # type: (Title) -> Entry
+        position = self.positions[key]
+        start = self.blob_offset + self.offsets[position]
+        return Entry(
+            self.titles[position],
+            self.cache_map[start:start + self.lengths[position]].decode('utf-8'),
+            self.filepaths[self.file_ids[position]],
+            self.line_nums[position],
+        )
+
+    def stats(self, key):
+        # type: (Title) -> EntryStats
+        """Get the cached statistics of an entry.
+
+        Parameters:
+            key: The title of the entry.
+
+        Returns:
+            EntryStats: The statistics of the entry.
+        """
+        record_offset = self.index_offset + self.positions[key] * CACHE_RECORD.size
+        return EntryStats(*CACHE_RECORD.unpack_from(self.cache_map, record_offset)[5:])
+
+    def raw_entry(self, position):
+        # type: (int) -> tuple[int, int, bytes, EntryStats]
+        """Get an entry by its position in the cache, without decoding its text.
+
+        Parameters:
+            position: The position of the entry in the cache.
+
+        Returns:
+            int: The file ID of the entry.
+            int: The line number of the entry.
+            bytes: The UTF-8 text of the entry.
+            EntryStats: The statistics of the entry.
+        """
+        record_offset = self.index_offset + position * CACHE_RECORD.size
+        file_id, line_num, _, offset, length, *stats = CACHE_RECORD.unpack_from(
+            self.cache_map,
+            record_offset,
+        )
+        start = self.blob_offset + offset
+        return file_id, line_num, self.cache_map[start:start + length], EntryStats(*stats)
+
+    def send_text(self, key, fd):
+        # type: (Title, int) -> None
+        """Write the UTF-8 text of an entry to a file descriptor without decoding it.
+
+        The text is copied by the kernel with sendfile if the file descriptor
+        supports it, and from the memory map otherwise.
+
+        Parameters:
+            key: The title of the entry.
+            fd: The file descriptor to write to.
+        """
+        position = self.positions[key]
+        offset = self.blob_offset + self.offsets[position]
+        remaining = self.lengths[position]
+        if self.use_sendfile:
+            start = offset
+            try:
+                while remaining:
+                    sent = sendfile(fd, self.cache_fd.fileno(), offset, remaining)
+                    if sent == 0:
+                        break
+                    offset += sent
+                    remaining -= sent
+            except OSError:
+                # which file descriptors sendfile accepts depends on the platform (macOS and
+                # BSD only accept sockets), so fall back if it fails before sending anything
+                if offset != start:
+                    raise
+                self.use_sendfile = False
+            else:
+                if remaining:
+                    raise OSError(EIO, 'cache file was truncated', self.cache_fd.name)
+                return
+        with memoryview(self.cache_map) as view:
+            write_all(fd, view[offset:offset + remaining])
+
+
+class SearchTerms:
+    """Search terms compiled into regular expressions."""
+
+    def __init__(self, terms, icase=True, whole_words=False, multiline=True):
+        # type: (Iterable[str], bool, bool, bool) -> None
+        """Initialize the search terms.
+
+        Parameters:
+            terms: The search terms.
+            icase: Ignore case. Defaults to True.
+            whole_words: Match must be the entire word. Defaults to False.
+            multiline: Whether ^ and $ match at lines. Defaults to True.
+        """
+        self.terms = list(terms)
+        self.icase = icase
+        self.whole_words = whole_words
+        self.flags = 0
+        if multiline:
+            self.flags |= re.MULTILINE
+        if icase:
+            self.flags |= re.IGNORECASE
+        self.patterns = [
+            (r'\b' + term + r'\b' if whole_words else term)
+            for term in self.terms
+        ]
+        self.regexes = [re.compile(pattern, flags=self.flags) for pattern in self.patterns]
+        self.literals = set(
+            index for index, term in enumerate(self.terms)
+            if not REGEX_META_REGEX.search(term)
+        )
+        # literal terms that are prefixes of other literal terms, which
+        # an alternation would not report if both match at the same position
+        folded = [(term.lower() if icase else term) for term in self.terms]
+        self.prefixes = {
+            index: [
+                other for other in self.literals
+                if other != index and folded[index].startswith(folded[other])
+            ]
+            for index in self.literals
+        }
+        self._alternations = {} # type: dict[tuple[int, ...], re.Pattern[str]]
+
+    def _alternation(self, indices):
+        # type: (tuple[int, ...]) -> re.Pattern[str]
+        if indices not in self._alternations:
+            self._alternations[indices] = re.compile(
+                '|'.join(
+                    f'(?=(?P<t{index}>{self.patterns[index]}))'
+                    for index in sorted(indices, key=(lambda i: -len(self.terms[i])))
+                ),
+                flags=self.flags,
+            )
+        return self._alternations[indices]
+
+    def _matches_literals(self, text, indices):
+        # type: (str, tuple[int, ...]) -> bool
+        remaining = set(indices)
+        for match in self._alternation(indices).finditer(text):
+            index = int(match.lastgroup[1:])
+            remaining.discard(index)
+            for other in self.prefixes[index]:
+                if other in remaining and self.regexes[other].match(text, match.start()):
+                    remaining.discard(other)
+            if not remaining:
+                return True
+        return False
+
+    def matches(self, text, indices=None):
+        # type: (str, Optional[Iterable[int]]) -> bool
+        """Check if text matches all the search terms.
+
+        Literal terms are checked together in a single scan of the text.
+
+        Parameters:
+            text: The text to search.
+            indices: The indices of the terms to check. Defaults to all terms.
+
+        Returns:
+            bool: True if every term matches the text.
+        """
+        if indices is None:
+            indices = range(len(self.terms))
+        literals = []
+        patterns = []
+        for index in indices:
+            if index in self.literals:
+                literals.append(index)
+            else:
+                patterns.append(index)
+        if len(literals) == 1:
+            patterns.insert(0, literals.pop())
+        elif literals and not self._matches_literals(text, tuple(literals)):
+            return False
+        return all(self.regexes[index].search(text) for index in patterns)
+
+
+class PhraseVariants:
+    """Hyphenated phrases, matched with each hyphen as a space, a hyphen, or nothing."""
+
+    def __init__(self, phrases):
+        # type: (Iterable[str]) -> None
+        """Initialize the phrases.
+
+        Parameters:
+            phrases: The lowercased hyphenated phrases.
+        """
+        # the phrases by their first part, and those whose first part is not a word
+        self.regexes = defaultdict(list) # type: dict[str, list[re.Pattern[str]]]
+        self.irregular_regexes = [] # type: list[re.Pattern[str]]
+        trie = {} # type: dict[str, Any]
+        for phrase in phrases:
+            parts = phrase.split('-')
+            regex = re.compile('[ -]?'.join(re.escape(part) for part in parts), flags=re.IGNORECASE)
+            if WORD_PART_REGEX.fullmatch(parts[0]):
+                self.regexes[parts[0]].append(regex)
+            else:
+                self.irregular_regexes.append(regex)
+            node = trie
+            for char in phrase:
+                node = node.setdefault(char, {})
+            node[''] = {}
+        # a single scan finds where any phrase starts
+        self.prefilter_regex = re.compile(
+            f"(?={PhraseVariants._trie_pattern(trie)})",
+            flags=re.IGNORECASE,
+        )
+        self._candidates = {} # type: dict[str, list[re.Pattern[str]]]
+
+    @staticmethod
+    def _trie_pattern(node):
+        # type: (dict[str, Any]) -> str
+        # a hyphen stands for an optional space or hyphen; the empty key ends a phrase
+        branches = [
+            ('[ -]?' if char == '-' else re.escape(char)) + PhraseVariants._trie_pattern(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not branches:
+            return ''
+        if len(branches) == 1 and '' not in node:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')' + ('?' if '' in node else '')
+
+    def _candidate_regexes(self, word):
+        # type: (str) -> list[re.Pattern[str]]
+        if word not in self._candidates:
+            lowered = word.lower()
+            self._candidates[word] = self.irregular_regexes + [
+                regex
+                for length in range(1, len(lowered) + 1)
+                for regex in self.regexes.get(lowered[:length], [])
+            ]
+        return self._candidates[word]
+
+    def finditer(self, text):
+        # type: (str) -> Generator[re.Match[str], None, None]
+        """Find every match of every phrase, including overlapping ones.
+
+        Parameters:
+            text: The text to search.
+
+        Yields:
+            re.Match[str]: Each match, in order of where it starts. The
+                pattern of the match is the same for each phrase.
+        """
+        for prefilter_match in self.prefilter_regex.finditer(text):
+            start = prefilter_match.start()
+            word = WORD_PART_REGEX.match(text, start)
+            if word is None:
+                candidates = self.irregular_regexes
+            else:
+                candidates = self._candidate_regexes(word.group())
+            for regex in candidates:
+                match = regex.match(text, start)
+                if match:
+                    yield match
+
+
+class WordIndex:
+    """An inverted index from lowercased words to the cache positions of entries."""
+
+    def __init__(self, index_map, vocabulary, postings_offset):
+        # type: (mmap, dict[str, tuple[int, int]], int) -> None
+        """Initialize the index.
+
+        Parameters:
+            index_map: The memory-mapped index file.
+            vocabulary: The offset and count of the postings of each word.
+            postings_offset: The offset of the postings in the index file.
+        """
+        self.index_map = index_map
+        self.vocabulary = vocabulary
+        self.postings_offset = postings_offset
+
+    def postings(self, word):
+        # type: (str) -> array[int]
+        """Get the positions of the entries that contain a word.
+
+        Parameters:
+            word: The lowercased word.
+
+        Returns:
+            array[int]: The positions of the entries.
+        """
+        postings = array('I')
+        if word in self.vocabulary:
+            offset, count = self.vocabulary[word]
+            start = self.postings_offset + offset * postings.itemsize
+            postings.frombytes(self.index_map[start:start + count * postings.itemsize])
+        return postings
+
+    def search(self, term, whole_words):
+        # type: (str, bool) -> Optional[set[int]]
+        """Find candidate entries for a literal search term.
+
+        Every entry that matches the term is a candidate, but not every
+        candidate matches the term; see is_exact.
+
+        Parameters:
+            term: The literal search term.
+            whole_words: Whether the term must match entire words.
+
+        Returns:
+            set[int]: The positions of the candidate entries, or None if the
+                index cannot narrow down the search.
+        """
+        words = WORD_REGEX.findall(term.lower())
+        if not words:
+            return None
+        candidates = None # type: Optional[set[int]]
+        for word in words:
+            if whole_words:
+                positions = set(self.postings(word))
+            else:
+                positions = set()
+                for token in self.vocabulary:
+                    if word in token:
+                        positions.update(self.postings(token))
+            if candidates is None:
+                candidates = positions
+            else:
+                candidates &= positions
+        return candidates
+
+    def entry_words(self, num_entries):
+        # type: (int) -> list[list[str]]
+        """Invert the index into the words of each entry.
+
+        Parameters:
+            num_entries: The number of entries in the index.
+
+        Returns:
+            list[list[str]]: The distinct lowercased words of each entry.
+        """
+        postings = array('I')
+        postings.frombytes(self.index_map[self.postings_offset:])
+        entry_words = [[] for _ in range(num_entries)] # type: list[list[str]]
+        for word, (offset, count) in self.vocabulary.items():
+            for position in postings[offset:offset + count]:
+                entry_words[position].append(word)
+        return entry_words
+
+    @staticmethod
+    def is_exact(term, icase):
+        # type: (str, bool) -> bool
+        """Check if the candidates for a term are exactly the matching entries.
+
+        Parameters:
+            term: The literal search term.
+            icase: Whether the search ignores case.
+
+        Returns:
+            bool: True if the candidates need no further checking.
+        """
+        return bool(icase and WORD_REGEX.fullmatch(term))
+
+
+class ReferenceGraph:
+    """The references between entries, by the cache positions of the entries."""
+
+    def __init__(self, num_refs, offsets, dests, date_offsets, dates):
+        # type: (array[int], array[int], array[int], array[int], array[int]) -> None
+        """Initialize the reference graph.
+
+        Parameters:
+            num_refs: The number of dates referenced by each entry.
+            offsets: The offset of the edges of each entry, plus the total.
+            dests: The earlier entries referenced by each entry.
+            date_offsets: The offset of the dates of each entry, plus the total.
+            dates: The ordinals of the dates referenced by each entry,
+                whether or not there are entries for them.
+        """
+        self.num_refs = num_refs
+        self.offsets = offsets
+        self.dests = dests
+        self.date_offsets = date_offsets
+        self.dates = dates
+
+    def references(self, position):
+        # type: (int) -> tuple[int, array[int]]
+        """Get the references of an entry.
+
+        Parameters:
+            position: The position of the entry.
+
+        Returns:
+            int: The number of dates referenced by the entry.
+            array[int]: The positions of the earlier entries it references.
+        """
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self.num_refs[position], self.dests[start:end]
+
+    def referenced_dates(self, position):
+        # type: (int) -> array[int]
+        """Get the dates referenced by an entry.
+
+        Parameters:
+            position: The position of the entry.
+
+        Returns:
+            array[int]: The ordinals of the referenced dates.
+        """
+        return self.dates[self.date_offsets[position]:self.date_offsets[position + 1]]
+
+
+class DisjointSets:
+    """A disjoint-set forest with path compression and union by rank."""
+
+    def __init__(self, size):
+        # type: (int) -> None
+        """Initialize the disjoint sets, with each element in its own set.
+
+        Parameters:
+            size: The number of elements.
+        """
+        self.parents = list(range(size))
+        self.ranks = [0] * size
+
+    def find(self, element):
+        # type: (int) -> int
+        """Find the representative of the set containing an element.
+
+        Parameters:
+            element: The element.
+
+        Returns:
+            int: The representative element.
+        """
+        root = element
+        while self.parents[root] != root:
+            root = self.parents[root]
+        while self.parents[element] != root:
+            self.parents[element], element = root, self.parents[element]
+        return root
+
+    def union(self, element1, element2):
+        # type: (int, int) -> None
+        """Merge the sets containing two elements.
+
+        Parameters:
+            element1: The first element.
+            element2: The second element.
+        """
+        root1 = self.find(element1)
+        root2 = self.find(element2)
+        if root1 == root2:
+            return
+        if self.ranks[root1] < self.ranks[root2]:
+            root1, root2 = root2, root1
+        self.parents[root2] = root1
+        if self.ranks[root1] == self.ranks[root2]:
+            self.ranks[root1] += 1
+
+
+class ProgressWriter(RawIOBase):
+    """A binary file wrapper that reports how much data has been written."""
+
+    def __init__(self, fileobj, interval=1.0):
+        # type: (IO[bytes], float) -> None
+        """Initialize the writer.
+
+        Parameters:
+            fileobj: The file to write to.
+            interval: The minimum number of seconds between reports.
+                Defaults to 1.0.
+        """
+        super().__init__()
+        self.fileobj = fileobj
+        self.interval = interval
+        self.num_bytes = 0
+        self.start_time = monotonic()
+        self.report_time = self.start_time
+
+    def write(self, data):
+        # type: (Any) -> int
+        """Write data and report progress if enough time has passed.
+
+        Parameters:
+            data: The bytes-like data to write.
+
+        Returns:
+            int: The number of bytes written.
+        """
+        self.fileobj.write(data)
+        self.num_bytes += len(data)
+        now = monotonic()
+        if now - self.report_time >= self.interval:
+            self.report_time = now
+            self.report(end='\r')
+        return len(data)
+
+    def writable(self):
+        # type: () -> bool
+        """Indicate that the writer supports writing.
+
+        Returns:
+            bool: Always True.
+        """
+        return True
+
+    def report(self, end='\n'):
+        # type: (str) -> None
+        """Print the amount of data written and the throughput to stderr.
+
+        Parameters:
+            end: The string to print after the report. Defaults to a newline.
+        """
+        elapsed = max(monotonic() - self.start_time, 1e-6)
+        mebibytes = self.num_bytes / 2**20
+        print(
+            f'{mebibytes:.1f} MiB in {elapsed:.1f}s ({mebibytes / elapsed:.1f} MiB/s)',
+            end=end,
+            file=stderr,
+            flush=True,
+        )
+
+
+class PhaseTimer:
+    """Wall times of the phases of a run.
+
+    Phases can be nested. The time of a phase excludes the time of the phases
+    nested inside it. Nothing is recorded unless the timer is enabled.
+    """
+
+    def __init__(self):
+        # type: () -> None
+        """Initialize the timer."""
+        self.enabled = False
+        self.timings = defaultdict(float) # type: dict[str, float]
+        self.stack = [] # type: list[str]
+        self.phase_start = 0.0
+
+    def start(self, phase):
+        # type: (str) -> PhaseTimer
+        """Start a phase, pausing the current one.
+
+        Parameters:
+            phase: The name of the phase.
+
+        Returns:
+            PhaseTimer: The timer, which stops the phase when used as a
+                context manager.
+        """
+        if self.enabled:
+            now = perf_counter()
+            if self.stack:
+                self.timings[self.stack[-1]] += now - self.phase_start
+            self.stack.append(phase)
+            self.phase_start = now
+        return self
+
+    def stop(self):
+        # type: () -> None
+        """Stop the current phase, resuming the one it was nested in."""
+        if self.enabled:
+            now = perf_counter()
+            self.timings[self.stack.pop()] += now - self.phase_start
+            self.phase_start = now
+
+    def __enter__(self):
+        # type: () -> PhaseTimer
+        return self
+
+    def __exit__(self, *_):
+        # type: (Any) -> None
+        self.stop()
+
+    def timed(self, iterable, phase):
+        # type: (Iterable[Any], str) -> Iterable[Any]
+        """Attribute the time spent producing each item to a phase.
+
+        Parameters:
+            iterable: The items.
+            phase: The name of the phase.
+
+        Returns:
+            Iterable[Any]: The same items.
+        """
+        if not self.enabled:
+            return iterable
+        return self._timed(iter(iterable), phase)
+
+    def _timed(self, iterator, phase):
+        # type: (Iterator[Any], str) -> Generator[Any, None, None]
+        done = object()
+        while True:
+            with self.start(phase):
+                item = next(iterator, done)
+            if item is done:
+                return
+            yield item
+
+
+PHASES = PhaseTimer()
+
+
+class JournalQuery:
+    """A lazy query over the entries of a journal.
+
+    Each method returns a new query, so queries can be composed. Entries are
+    streamed from the sorted title index, date entries before word entries.
+    """
+
+    def __init__(self, journal):
+        # type: (Journal) -> None
+        """Initialize the query.
+
+        Parameters:
+            journal: The journal.
+        """
+        self.journal = journal
+        self._date_ranges = () # type: tuple[DateRange, ...]
+        self._title_type = None # type: Optional[str]
+        self._search_terms = None # type: Optional[SearchTerms]
+        self._reverse = False
+        self._limit = None # type: Optional[int]
+
+    def _derive(self, **attrs):
+        # type: (Any) -> JournalQuery
+        query = copy(self)
+        for attr, value in attrs.items():
+            setattr(query, attr, value)
+        return query
+
+    def in_dates(self, *date_ranges):
+        # type: (DateRange) -> JournalQuery
+        """Select date entries within any of the date ranges.
+
+        Parameters:
+            *date_ranges: The date ranges.
+
+        Returns:
+            JournalQuery: The narrowed query.
+        """
+        return self._derive(_date_ranges=date_ranges, _title_type='date')
+
+    def of_type(self, title_type):
+        # type: (Optional[str]) -> JournalQuery
+        """Select entries by title type.
+
+        Parameters:
+            title_type: One of 'date', 'word', or None for all entries.
+
+        Returns:
+            JournalQuery: The narrowed query.
+        """
+        return self._derive(_title_type=title_type)
+
+    def matching(self, terms, icase=True, whole_words=False):
+        # type: (Iterable[str], bool, bool) -> JournalQuery
+        """Select entries that match all search terms.
+
+        Parameters:
+            terms: The search terms.
+            icase: Ignore case. Defaults to True.
+            whole_words: Match must be the entire word. Defaults to False.
+
+        Returns:
+            JournalQuery: The narrowed query.
+        """
+        return self._derive(_search_terms=SearchTerms(terms, icase, whole_words))
+
+    def ordered(self, reverse=True):
+        # type: (bool) -> JournalQuery
+        """Set the order of the entries.
+
+        Parameters:
+            reverse: Whether to list entries in reverse. Defaults to True.
+
+        Returns:
+            JournalQuery: The reordered query.
+        """
+        return self._derive(_reverse=reverse)
+
+    def limit(self, limit):
+        # type: (Optional[int]) -> JournalQuery
+        """Stop after a number of entries.
+
+        Parameters:
+            limit: The maximum number of entries, or None for no limit.
+
+        Returns:
+            JournalQuery: The limited query.
+        """
+        return self._derive(_limit=limit)
+
+    def _titles(self):
+        # type: () -> Generator[Title, None, None]
+        # pylint: disable = protected-access
+        _, date_titles = self.journal._read_date_index()
+        if self._date_ranges:
+            slices = self.journal._date_slices(self._date_ranges)
+            if self._reverse:
+                for start, end in reversed(slices):
+                    yield from (date_titles[index] for index in range(end - 1, start - 1, -1))
+            else:
+                for start, end in slices:
+                    yield from (date_titles[index] for index in range(start, end))
+            return
+        if self._title_type != 'word':
+            yield from (reversed(date_titles) if self._reverse else date_titles)
+        if self._title_type != 'date':
+            titles = self.journal._read_title_index()
+            yield from (
+                title for title in (reversed(titles) if self._reverse else titles)
+                if not title.is_date
+            )
+
+    def titles(self):
+        # type: () -> Iterable[Title]
+        """Stream the titles of the selected entries.
+
+        Returns:
+            Iterable[Title]: The title of each selected entry.
+        """
+        return PHASES.timed(self._select_titles(), 'filter')
+
+    def _select_titles(self):
+        # type: () -> Generator[Title, None, None]
+        # pylint: disable = protected-access
+        entries = self.journal.entries
+        titles = self._titles() # type: Iterable[Title]
+        search_terms = self._search_terms
+        if search_terms is not None:
+            candidates, unindexed = self.journal._term_candidates(search_terms)
+            if candidates is not None:
+                titles = (title for title in titles if title in candidates)
+            if unindexed:
+                titles = (
+                    title for title in titles
+                    if search_terms.matches(entries[title].text, unindexed)
+                )
+        if self._limit is not None:
+            titles = islice(titles, self._limit)
+        yield from titles
+
+    def __iter__(self):
+        # type: () -> Generator[Entry, None, None]
+        entries = self.journal.entries
+        for title in self.titles():
+            yield entries[title]
+
+
 class Journal(Entries):
     """A journal."""
 
-    def __init__(self, directory, use_cache=True, ignores=None):
-        # type: (Union[Path, str], bool,  Optional[set[Path]]) -> None
+    def __init__(self, directory, use_cache=True, ignores=None, auto_update=True):
+        # type: (Union[Path, str], bool,  Optional[set[Path]], bool) -> None
         """Initialize the journal.
 
         Parameters:
             directory: The directory of the journal.
             use_cache: Whether to use the cache file. Defaults to True.
             ignores: Paths to ignore. Optional.
+            auto_update: Whether to update missing metadata when loading the
+                cache. Defaults to True.
         """
         if isinstance(directory, str):
             directory = Path(directory)
@@ -116,13 +1013,17 @@ class Journal(Entries):
             self.ignores = set()
         else:
             self.ignores = set(ignores)
-        self.entries = {} # type: dict[Title, Entry]
+        self.use_cache = use_cache
+        self.entries = {} # type: Entries
+        self._manifest = None # type: Optional[list[FileRecord]]
+        self._word_index = None # type: Optional[WordIndex]
+        self._title_index = None # type: Optional[list[Title]]
+        self._date_index = None # type: Optional[tuple[array[int], list[Title]]]
+        self._reference_graph = None # type: Optional[ReferenceGraph]
         if use_cache:
-            self._check_metadata()
-            self._read_cache()
+            self._check_metadata(auto_update)
         else:
-            for journal_file in self.journal_files:
-                self._read_file(journal_file)
+            self.entries = self._read_files()
 
     def __len__(self):
         # type: () -> int
@@ -130,7 +1031,7 @@ class Journal(Entries):
 
     def __iter__(self):
         # type: () -> Generator[Title, None, None]
-        yield from sorted(self.entries)
+        yield from self._read_title_index()
 
     def __getitem__(self, key):
         # type: (Title) -> Entry
@@ -171,68 +1072,440 @@ class Journal(Entries):
         """
         return self.directory / '.cache'
 
-    def _check_metadata(self):
-        # type: () -> None
+    @property
+    def index_file(self):
+        # type: () -> Path
+        """Get the word index file associated with this Journal.
+
+        Returns:
+            Path: The word index file.
+        """
+        return self.directory / '.index'
+
+    @property
+    def refs_file(self):
+        # type: () -> Path
+        """Get the reference graph file associated with this Journal.
+
+        Returns:
+            Path: The reference graph file.
+        """
+        return self.directory / '.refs'
+
+    @property
+    def socket_file(self):
+        # type: () -> Path
+        """Get the server socket file associated with this Journal.
+
+        Returns:
+            Path: The socket file.
+        """
+        return self.directory / SOCKET_FILENAME
+
+    @property
+    def file_stats(self):
+        # type: () -> set[tuple[Path, int, int]]
+        """Get the modification times and sizes of the journal files.
+
+        Returns:
+            set[tuple[Path, int, int]]: The path, mtime, and size of each file.
+        """
+        stats = set()
+        for journal_file in self.journal_files:
+            file_stat = journal_file.stat()
+            stats.add((journal_file, file_stat.st_mtime_ns, file_stat.st_size))
+        return stats
+
+    def _check_metadata(self, auto_update):
+        # type: (bool) -> None
         metadata_files = (
             self.tags_file,
             self.cache_file,
+            self.index_file,
+            self.refs_file,
         )
-        if not all(metadata_file.exists() for metadata_file in metadata_files):
+        if (
+            all(metadata_file.exists() for metadata_file in metadata_files)
+            and self._read_cache()
+            and isinstance(self.entries, MappedEntries)
+            and self._metadata_matches(self.index_file, INDEX_HEADER, INDEX_MAGIC, self.entries)
+            and self._metadata_matches(self.refs_file, REFS_HEADER, REFS_MAGIC, self.entries)
+        ):
+            return
+        if auto_update:
             self.update_metadata()
 
-    def _read_file(self, filepath):
-        # type: (Path) -> None
-        with filepath.open() as fd:
-            line_num = 1
-            for raw_entry in fd.read().strip().split('\n\n'):
-                if not raw_entry.strip():
-                    continue
-                lines = raw_entry.splitlines()
-                title = Title(lines[0])
-                self.entries[title] = Entry(
-                    title,
-                    raw_entry,
-                    filepath,
-                    line_num,
-                )
-                line_num += len(lines) + 1
+    def _read_files(self):
+        # type: () -> dict[Title, Entry]
+        entries = {} # type: dict[Title, Entry]
+        for journal_file in self.journal_files:
+            with journal_file.open() as fd:
+                for title_str, line_num, text in parse_entries(fd.read()):
+                    title = Title(title_str)
+                    entries[title] = Entry(title, text, journal_file, line_num)
+        return entries
+
+    def _map_cache(self):
+        # type: () -> Optional[tuple[MappedEntries, list[FileRecord]]]
+        """Memory-map the cache file.
+
+        Returns:
+            MappedEntries: The cached entries.
+            list[FileRecord]: The per-file records, without their entries.
+        """
+        if not self.cache_file.exists() or self.cache_file.stat().st_size < CACHE_HEADER.size:
+            return None
+        cache_fd = self.cache_file.open('rb')
+        cache_map = mmap(cache_fd.fileno(), 0, access=ACCESS_READ)
+        magic, version, _, num_entries, manifest_len = CACHE_HEADER.unpack_from(cache_map)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            cache_fd.close()
+            return None
+        manifest_offset = CACHE_HEADER.size + num_entries * CACHE_RECORD.size
+        blob_offset = manifest_offset + manifest_len
+        manifest = json_from_str(cache_map[manifest_offset:blob_offset].decode('utf-8'))
+        entries = MappedEntries(
+            cache_fd,
+            cache_map,
+            blob_offset,
+            [self.directory / file_record['path'] for file_record in manifest],
+        )
+        return entries, manifest
 
     def _read_cache(self):
-        # type: () -> None
-        with self.cache_file.open() as fd:
-            for title, entry_dict in json_read(fd).items():
-                title = Title(title)
-                self.entries[title] = Entry(
-                    title,
-                    entry_dict['text'],
-                    self.directory / entry_dict['rel_path'],
-                    entry_dict['line_num'],
-                )
+        # type: () -> bool
+        mapped_cache = self._map_cache()
+        if mapped_cache is None:
+            return False
+        self.entries, self._manifest = mapped_cache
+        self._word_index = None
+        self._title_index = None
+        self._date_index = None
+        self._reference_graph = None
+        return True
+
+    def _read_file_records(self):
+        # type: () -> dict[str, FileRecord]
+        """Read the per-file records of the cache.
+
+        The text of each entry is kept as the UTF-8 bytes from the cache, and
+        the words and referenced dates are recovered from the word index and
+        the reference graph, so no entry has to be decoded.
 
-    def _filter_by_terms(self, selected, terms, icase, whole_words):
-        # type: (set[Title], Iterable[str], bool, bool) -> set[Title]
-        flags = re.MULTILINE
-        if icase:
-            flags |= re.IGNORECASE
-        for term in terms:
-            if whole_words:
-                term = r'\b' + term + r'\b'
-            selected = set(
-                title for title in selected
-                if re.search(term, self.entries[title].text, flags=flags)
+        Returns:
+            dict[str, FileRecord]: The per-file records, by relative path.
+        """
+        if not self.use_cache:
+            return {}
+        # the cache is usually already mapped, since -I loads the journal without updating it
+        if isinstance(self.entries, MappedEntries) and self._manifest is not None:
+            mapped_cache = (self.entries, self._manifest)
+        else:
+            mapped_cache = self._map_cache()
+        if mapped_cache is None:
+            return {}
+        entries, manifest = mapped_cache
+        word_index = self._map_word_index(entries)
+        if word_index is None:
+            entry_words = None
+        else:
+            entry_words = word_index.entry_words(len(entries))
+        reference_graph = self._load_reference_graph(entries)
+        file_records = {}
+        records_by_id = []
+        for manifest_record in manifest:
+            file_record = {
+                key: value for key, value in manifest_record.items()
+                if key != 'path'
+            } # type: FileRecord
+            for field in ENTRY_FIELDS:
+                file_record[field] = []
+            file_records[manifest_record['path']] = file_record
+            records_by_id.append(file_record)
+        for position, title in enumerate(entries.titles):
+            file_id, line_num, data, stats = entries.raw_entry(position)
+            file_record = records_by_id[file_id]
+            file_record['entries'].append((title.title, line_num, data))
+            file_record['stats'].append(stats)
+            file_record['words'].append(
+                text_words(data.decode('utf-8')) if entry_words is None
+                else entry_words[position]
             )
-        return selected
-
-    def _filter_by_date(self, selected, *date_ranges):
-        # type: (set[Title], DateRange) -> set[Title]
-        first_date = min(selected).date
-        last_date = next_date(max(selected).date)
-        candidates = set()
-        for date_range in date_ranges:
-            start_date, end_date = date_range
-            start_date, end_date = (start_date or first_date, end_date or last_date)
-            candidates |= set(k for k in selected if start_date <= k.date < end_date)
-        return candidates
+            file_record['dates'].append(
+                text_dates(data.decode('utf-8')) if reference_graph is None
+                else reference_graph.referenced_dates(position)
+            )
+        return file_records
+
+    def _load_file_records(self, file_records):
+        # type: (dict[str, FileRecord]) -> None
+        entries = {} # type: dict[Title, Entry]
+        for rel_path, file_record in file_records.items():
+            filepath = self.directory / rel_path
+            for title_str, line_num, data in file_record['entries']:
+                title = Title(title_str)
+                entries[title] = Entry(title, data.decode('utf-8'), filepath, line_num)
+        self._load_entries(entries)
+
+    def _load_entries(self, entries):
+        # type: (dict[Title, Entry]) -> None
+        self.entries = entries
+        self._manifest = None
+        self._word_index = None
+        self._title_index = None
+        self._date_index = None
+        self._reference_graph = None
+
+    def _metadata_matches(self, filepath, header, magic, entries):
+        # type: (Path, Struct, bytes, MappedEntries) -> bool
+        """Check that a metadata file was written along with the mapped cache.
+
+        Parameters:
+            filepath: The metadata file.
+            header: The header format of the file.
+            magic: The magic bytes of the file.
+            entries: The cached entries.
+
+        Returns:
+            bool: True if the file matches the cache.
+        """
+        with filepath.open('rb') as fd:
+            return self._header_matches(fd.read(header.size), header, magic, entries)
+
+    @staticmethod
+    def _header_matches(data, header, magic, entries):
+        # type: (Union[bytes, mmap], Struct, bytes, MappedEntries) -> bool
+        """Check the header of a metadata file against the cache.
+
+        An interrupted update can leave an index or reference graph from an
+        older cache behind, so the generation must match and not just the
+        number of entries.
+
+        Parameters:
+            data: The start of the metadata file.
+            header: The header format of the file.
+            magic: The magic bytes of the file.
+            entries: The cached entries.
+
+        Returns:
+            bool: True if the header matches the cache.
+        """
+        if len(data) < header.size:
+            return False
+        file_magic, version, generation, num_entries, _ = header.unpack_from(data)
+        return (
+            file_magic == magic
+            and version == CACHE_VERSION
+            and generation == entries.generation
+            and num_entries == len(entries)
+        )
+
+    def _read_word_index(self):
+        # type: () -> Optional[WordIndex]
+        if self._word_index is not None:
+            return self._word_index
+        if not isinstance(self.entries, MappedEntries):
+            return None
+        self._word_index = self._map_word_index(self.entries)
+        return self._word_index
+
+    def _map_word_index(self, entries):
+        # type: (MappedEntries) -> Optional[WordIndex]
+        """Memory-map the word index file.
+
+        Parameters:
+            entries: The cached entries.
+
+        Returns:
+            WordIndex: The word index, or None if it does not match the cache.
+        """
+        if not self.index_file.exists() or self.index_file.stat().st_size < INDEX_HEADER.size:
+            return None
+        with self.index_file.open('rb') as fd:
+            index_map = mmap(fd.fileno(), 0, access=ACCESS_READ)
+        if not self._header_matches(index_map, INDEX_HEADER, INDEX_MAGIC, entries):
+            return None
+        vocabulary_len = INDEX_HEADER.unpack_from(index_map)[-1]
+        postings_offset = INDEX_HEADER.size + vocabulary_len
+        vocabulary = json_from_str(index_map[INDEX_HEADER.size:postings_offset].decode('utf-8'))
+        return WordIndex(index_map, vocabulary, postings_offset)
+
+    def _read_reference_graph(self):
+        # type: () -> Optional[ReferenceGraph]
+        if self._reference_graph is not None:
+            return self._reference_graph
+        if not isinstance(self.entries, MappedEntries):
+            return None
+        self._reference_graph = self._load_reference_graph(self.entries)
+        return self._reference_graph
+
+    def _load_reference_graph(self, entries):
+        # type: (MappedEntries) -> Optional[ReferenceGraph]
+        """Read the reference graph file.
+
+        Parameters:
+            entries: The cached entries.
+
+        Returns:
+            ReferenceGraph: The reference graph, or None if it does not match
+                the cache.
+        """
+        if not self.refs_file.exists() or self.refs_file.stat().st_size < REFS_HEADER.size:
+            return None
+        with self.refs_file.open('rb') as fd:
+            header = fd.read(REFS_HEADER.size)
+            if not self._header_matches(header, REFS_HEADER, REFS_MAGIC, entries):
+                return None
+            num_entries = len(entries)
+            num_edges = REFS_HEADER.unpack(header)[-1]
+            num_refs = array('I')
+            num_refs.fromfile(fd, num_entries)
+            offsets = array('I')
+            offsets.fromfile(fd, num_entries + 1)
+            dests = array('I')
+            dests.fromfile(fd, num_edges)
+            date_offsets = array('I')
+            date_offsets.fromfile(fd, num_entries + 1)
+            dates = array('I')
+            dates.fromfile(fd, date_offsets[-1])
+        return ReferenceGraph(num_refs, offsets, dests, date_offsets, dates)
+
+    def references(self, title):
+        # type: (Title) -> tuple[int, list[Title]]
+        """Get the references of an entry.
+
+        Parameters:
+            title: The title of the entry.
+
+        Returns:
+            int: The number of dates referenced by the entry.
+            list[Title]: The earlier entries referenced by the entry.
+        """
+        reference_graph = self._read_reference_graph()
+        if reference_graph is None:
+            references = REFERENCE_REGEX.findall(self.entries[title].text)
+            dest_titles = set(Title(dest) for dest in references)
+            return len(references), [
+                dest for dest in dest_titles
+                if title > dest and dest in self.entries
+            ]
+        assert isinstance(self.entries, MappedEntries)
+        num_refs, dest_positions = reference_graph.references(self.entries.positions[title])
+        return num_refs, [self.entries.titles[position] for position in dest_positions]
+
+    def entry_stats(self, title):
+        # type: (Title) -> EntryStats
+        """Get the statistics of an entry.
+
+        Parameters:
+            title: The title of the entry.
+
+        Returns:
+            EntryStats: The statistics of the entry.
+        """
+        if isinstance(self.entries, MappedEntries):
+            return self.entries.stats(title)
+        return text_stats(self.entries[title].text)
+
+    def write_text(self, title, fd):
+        # type: (Title, int) -> None
+        """Write the text of an entry to a file descriptor.
+
+        Parameters:
+            title: The title of the entry.
+            fd: The file descriptor to write to.
+        """
+        if isinstance(self.entries, MappedEntries):
+            self.entries.send_text(title, fd)
+        else:
+            write_all(fd, self.entries[title].text.encode('utf-8'))
+
+    def _term_candidates(self, search_terms):
+        # type: (SearchTerms) -> tuple[Optional[set[Title]], list[int]]
+        """Narrow down the entries that could match the search terms.
+
+        Parameters:
+            search_terms: The search terms.
+
+        Returns:
+            Optional[set[Title]]: The candidate titles, or None if the word
+                index could not narrow them down.
+            list[int]: The indices of the terms that still need to be matched
+                against the text of each candidate.
+        """
+        word_index = self._read_word_index()
+        candidates = None # type: Optional[set[Title]]
+        unindexed = []
+        for index, term in enumerate(search_terms.terms):
+            if word_index is None or index not in search_terms.literals:
+                unindexed.append(index)
+                continue
+            positions = word_index.search(term, search_terms.whole_words)
+            if positions is None:
+                unindexed.append(index)
+                continue
+            assert isinstance(self.entries, MappedEntries)
+            titles = set(self.entries.titles[position] for position in positions)
+            if candidates is None:
+                candidates = titles
+            else:
+                candidates &= titles
+            if not word_index.is_exact(term, search_terms.icase):
+                unindexed.append(index)
+        return candidates, unindexed
+
+    def _read_title_index(self):
+        # type: () -> list[Title]
+        if self._title_index is None:
+            self._title_index = sorted(self.entries)
+        return self._title_index
+
+    def _read_date_index(self):
+        # type: () -> tuple[array[int], list[Title]]
+        if self._date_index is None:
+            titles = [title for title in self._read_title_index() if title.is_date]
+            self._date_index = (array('I', (title.ordinal for title in titles)), titles)
+        return self._date_index
+
+    def _date_slices(self, date_ranges):
+        # type: (Sequence[DateRange]) -> list[tuple[int, int]]
+        """Convert date ranges to disjoint slices of the date index.
+
+        Parameters:
+            date_ranges: The date ranges.
+
+        Returns:
+            list[tuple[int, int]]: The sorted start and end positions.
+        """
+        ordinals, _ = self._read_date_index()
+        slices = []
+        for start_date, end_date in date_ranges:
+            if start_date is None:
+                start = 0
+            else:
+                start = bisect_left(ordinals, start_date.toordinal())
+            if end_date is None:
+                end = len(ordinals)
+            else:
+                end = bisect_left(ordinals, end_date.toordinal())
+            slices.append((start, end))
+        merged = [] # type: list[tuple[int, int]]
+        prev_end = 0
+        for start, end in sorted(slices):
+            start = max(start, prev_end)
+            if start < end:
+                merged.append((start, end))
+                prev_end = end
+        return merged
+
+    def query(self):
+        # type: () -> JournalQuery
+        """Start a query over all entries.
+
+        Returns:
+            JournalQuery: The query.
+        """
+        return JournalQuery(self)
 
     def filter(self, terms=None, icase=True, whole_words=False, date_ranges=None, title_type=None):
         # type: (Iterable[str], bool, bool, Sequence[DateRange], str) -> dict[Title, Entry]
@@ -248,41 +1521,165 @@ class Journal(Entries):
         Returns:
             dict[str, Entry]: The entries.
         """
-        selected = set(self.entries.keys())
-        if title_type == 'date':
-            selected = set(title for title in selected if title.is_date)
-            if date_ranges:
-                selected = self._filter_by_date(selected, *date_ranges)
-        elif title_type == 'word':
-            selected = set(title for title in selected if not title.is_date)
-        if terms:
-            selected = self._filter_by_terms(selected, terms, icase, whole_words)
-        return {title: self.entries[title] for title in selected}
-
-    def _write_tags_file(self):
-        # type: () -> None
+        with PHASES.start('filter'):
+            query = self.query().of_type(title_type)
+            if title_type == 'date' and date_ranges:
+                query = query.in_dates(*date_ranges)
+            if terms:
+                query = query.matching(terms, icase, whole_words)
+            return {entry.title: entry for entry in query}
+
+    def _write_tags_file(self, file_records, titles):
+        # type: (dict[str, FileRecord], list[Title]) -> None
+        locations = sorted(
+            zip(
+                titles,
+                chain.from_iterable(
+                    [rel_path] * len(file_record['entries'])
+                    for rel_path, file_record in file_records.items()
+                ),
+                chain.from_iterable(
+                    (line_num for _, line_num, _ in file_record['entries'])
+                    for file_record in file_records.values()
+                ),
+            ),
+            key=(lambda location: location[0]),
+        )
         tags = []
-        for title, entry in sorted(self.entries.items()):
-            filepath = entry.filepath.relative_to(self.directory)
+        for title, rel_path, line_num in locations:
             if len(title.title) > 10 and DATE_REGEX.fullmatch(title.title):
-                tags.append(f'{title.title[:10]}\t{filepath}\t{entry.line_num}')
-            tags.append(f'{title.title}\t{filepath}\t{entry.line_num}')
-        with self.tags_file.open('w', encoding='utf-8') as fd:
-            fd.write('\n'.join(tags))
+                tags.append(f'{title.title[:10]}\t{rel_path}\t{line_num}')
+            tags.append(f'{title.title}\t{rel_path}\t{line_num}')
+        replace_file(self.tags_file, '\n'.join(tags).encode('utf-8'))
+
+    def _write_cache(self, file_records, generation):
+        # type: (dict[str, FileRecord], bytes) -> None
+        manifest = []
+        index = bytearray()
+        blob = bytearray()
+        for file_id, (rel_path, file_record) in enumerate(file_records.items()):
+            manifest.append({
+                'path': rel_path,
+                **{
+                    key: value for key, value in file_record.items()
+                    if key not in ENTRY_FIELDS
+                },
+            })
+            for (title, line_num, data), stats in zip(file_record['entries'], file_record['stats']):
+                index += CACHE_RECORD.pack(
+                    file_id,
+                    line_num,
+                    len(title.encode('utf-8')),
+                    len(blob),
+                    len(data),
+                    *stats,
+                )
+                blob += data
+        manifest_bytes = json_to_str(manifest).encode('utf-8')
+        header = CACHE_HEADER.pack(
+            CACHE_MAGIC,
+            CACHE_VERSION,
+            generation,
+            len(index) // CACHE_RECORD.size,
+            len(manifest_bytes),
+        )
+        replace_file(self.cache_file, header, index, manifest_bytes, blob)
+
+    def _write_word_index(self, file_records, generation):
+        # type: (dict[str, FileRecord], bytes) -> None
+        word_postings = defaultdict(list) # type: dict[str, list[int]]
+        position = 0
+        for file_record in file_records.values():
+            for words in file_record['words']:
+                for word in words:
+                    word_postings[word].append(position)
+                position += 1
+        vocabulary = {}
+        postings = array('I')
+        for word, positions in sorted(word_postings.items()):
+            vocabulary[word] = (len(postings), len(positions))
+            postings.extend(positions)
+        vocabulary_bytes = json_to_str(vocabulary).encode('utf-8')
+        replace_file(
+            self.index_file,
+            INDEX_HEADER.pack(
+                INDEX_MAGIC,
+                CACHE_VERSION,
+                generation,
+                position,
+                len(vocabulary_bytes),
+            ),
+            vocabulary_bytes,
+            postings.tobytes(),
+        )
 
-    def _write_cache(self):
-        # type: () -> None
-        entries = {
-            str(title): {
-                'title': str(title),
-                'rel_path': str(entry.filepath.relative_to(self.directory)),
-                'line_num': entry.line_num,
-                'text': entry.text,
-            }
-            for title, entry in self.entries.items()
+    def _write_reference_graph(self, file_records, titles, generation):
+        # type: (dict[str, FileRecord], list[Title], bytes) -> None
+        positions = {
+            title.ordinal: position for position, title in enumerate(titles)
+            if title.is_date
         }
-        with self.cache_file.open('w', encoding='utf-8') as fd:
-            json_write(entries, fd)
+        num_refs = array('I')
+        offsets = array('I', [0])
+        dests = array('I')
+        date_offsets = array('I', [0])
+        dates = array('I')
+        for src, stats, entry_dates in zip(
+            titles,
+            chain.from_iterable(file_record['stats'] for file_record in file_records.values()),
+            chain.from_iterable(file_record['dates'] for file_record in file_records.values()),
+        ):
+            num_refs.append(stats.num_refs)
+            dests.extend(sorted(
+                positions[date] for date in entry_dates
+                if date in positions and src > titles[positions[date]]
+            ))
+            offsets.append(len(dests))
+            dates.extend(entry_dates)
+            date_offsets.append(len(dates))
+        replace_file(
+            self.refs_file,
+            REFS_HEADER.pack(REFS_MAGIC, CACHE_VERSION, generation, len(titles), len(dests)),
+            num_refs.tobytes(),
+            offsets.tobytes(),
+            dests.tobytes(),
+            date_offsets.tobytes(),
+            dates.tobytes(),
+        )
+
+    def _find_changed_files(self):
+        # type: () -> tuple[dict[str, FileRecord], dict[str, FileRecord], list[tuple[str, Path]]]
+        """Find the journal files that changed since the last cache.
+
+        A file is considered unchanged if its mtime and size match the cached
+        record.
+
+        Returns:
+            dict[str, FileRecord]: The cached per-file records, by relative path.
+            dict[str, FileRecord]: The cached records of the unchanged files,
+                and the mtime and size of the changed files, by relative path.
+            list[tuple[str, Path]]: The relative path and path of each changed file.
+        """
+        old_records = self._read_file_records()
+        file_records = {} # type: dict[str, FileRecord]
+        changed_files = []
+        for journal_file in sorted(self.journal_files):
+            rel_path = str(journal_file.relative_to(self.directory))
+            file_stat = journal_file.stat()
+            file_record = old_records.get(rel_path)
+            if (
+                file_record is not None
+                and file_record['mtime'] == file_stat.st_mtime_ns
+                and file_record['size'] == file_stat.st_size
+            ):
+                file_records[rel_path] = file_record
+            else:
+                file_records[rel_path] = {
+                    'mtime': file_stat.st_mtime_ns,
+                    'size': file_stat.st_size,
+                }
+                changed_files.append((rel_path, journal_file))
+        return old_records, file_records, changed_files
 
     def lint(self):
         # type: () -> list[tuple[Path, int, str]]
@@ -291,75 +1688,444 @@ class Journal(Entries):
         Returns:
             list[tuple[Path, int, str]]: A list of errors.
         """
-        ascii_regex = re.compile('(\t*[!-~]([ -~]*[!-~])?)?')
-        errors = []
-        titles = set()
-        long_dates = None
-        for journal_file in self.journal_files:
-            has_date_stem = RANGE_BOUND_REGEX.fullmatch(journal_file.stem)
-            with journal_file.open() as fd:
-                lines = fd.read().splitlines()
-            if not lines:
+        journal_files = sorted(self.journal_files)
+        errors = [] # type: list[tuple[Path, int, str]]
+        titles_by_file = [] # type: list[tuple[Path, list[tuple[str, int]]]]
+        for journal_file, file_lint in zip(
+            journal_files,
+            map_journal_files(lint_journal_file, journal_files),
+        ):
+            if file_lint is None:
                 journal_file.unlink()
                 continue
-            if lines[0].startswith('\ufeff'):
-                errors.append((journal_file, 1, 'byte order mark'))
-            elif lines[0].strip() == '':
-                errors.append((journal_file, 1, 'file starts on blank line'))
-            if lines[-1].strip() == '':
-                errors.append((journal_file, len(lines), 'file ends on blank line'))
-            prev_indent = 0
-            prev_line = ''
-            for line_num, line in enumerate(lines, start=1): # pylint: disable = unused-variable
-                indent = len(re.match('\t*', line)[0])
-                if not ascii_regex.fullmatch(line):
-                    errors.append(log_error(
-                        'non-tab indentation, trailing whitespace, or non-ASCII character'
-                    ))
-                line = line.strip()
-                if not line.startswith('|') and '  ' in line:
-                    errors.append(log_error('multiple spaces'))
-                if indent == 0:
-                    if line:
-                        if prev_indent != 0 or prev_line != '':
-                            errors.append(log_error('no blank line between entries'))
-                        if DATE_REGEX.fullmatch(line):
-                            if long_dates is None:
-                                long_dates = (len(line) > DATE_LENGTH)
-                            elif long_dates != (len(line) > DATE_LENGTH):
-                                errors.append(log_error('inconsistent date format'))
-                            if not title_to_date(line).strftime('%Y-%m-%d, %A').startswith(line):
-                                errors.append(log_error('date-weekday correctness'))
-                            if has_date_stem and not line.startswith(journal_file.stem):
-                                errors.append(log_error("filename doesn't match entry"))
-                        if line in titles:
-                            errors.append(log_error('duplicate titles'))
-                        titles.add(line)
-                    elif prev_indent == 0:
-                        errors.append(log_error('consecutive unindented lines'))
-                elif indent - prev_indent > 1:
-                    errors.append(log_error('unexpected indentation'))
-                prev_indent = indent
-                prev_line = line
-        return sorted(errors)
+            file_errors, file_titles = file_lint
+            errors.extend((journal_file, line_num, message) for line_num, message in file_errors)
+            titles_by_file.append((journal_file, file_titles))
+        return sorted(errors + lint_titles(titles_by_file))
 
     def update_metadata(self):
         # type: () -> list[tuple[Path, int, str]]
-        """Update the tags file and the cache.
+        """Update the tags file, the cache, the word index, and the reference graph.
+
+        Only files that have changed since the last update are re-linted and
+        re-parsed; the rest are reused from the cache. Changed files are only
+        parsed if the journal has no errors.
 
         Returns:
             list[tuple[Path, int, str]]: A list of errors.
         """
-        errors = self.lint()
-        if not errors:
-            self._write_tags_file()
-            self._write_cache()
+        old_records, file_records, changed_files = self._find_changed_files()
+        changed_paths = [journal_file for _, journal_file in changed_files]
+        file_lints = dict(zip(changed_paths, map_journal_files(lint_journal_file, changed_paths)))
+        errors = [] # type: list[tuple[Path, int, str]]
+        titles_by_file = [] # type: list[tuple[Path, list[tuple[str, int]]]]
+        for rel_path, file_record in list(file_records.items()):
+            journal_file = self.directory / rel_path
+            if journal_file not in file_lints:
+                file_titles = [
+                    (title, line_num) for title, line_num, _ in file_record['entries']
+                ]
+            elif file_lints[journal_file] is None:
+                journal_file.unlink()
+                del file_records[rel_path]
+                continue
+            else:
+                file_errors, file_titles = file_lints[journal_file]
+                errors.extend(
+                    (journal_file, line_num, message) for line_num, message in file_errors
+                )
+            titles_by_file.append((journal_file, file_titles))
+        errors = sorted(errors + lint_titles(titles_by_file))
+        if errors:
+            self._load_entries(self._read_files())
+            return errors
+        changed_files = [
+            (rel_path, journal_file) for rel_path, journal_file in changed_files
+            if rel_path in file_records
+        ]
+        for (rel_path, journal_file), file_record in zip(
+            changed_files,
+            map_journal_files(
+                read_file_record,
+                [journal_file for _, journal_file in changed_files],
+                [old_records.get(rel_path, {}).get('hash') for rel_path, _ in changed_files],
+            ),
+        ):
+            if file_record is None:
+                journal_file.unlink()
+                del file_records[rel_path]
+                continue
+            if 'entries' not in file_record:
+                file_record = {**old_records[rel_path], **file_record}
+            file_records[rel_path] = {**file_record, **file_records[rel_path]}
+        titles = [
+            Title(title)
+            for file_record in file_records.values()
+            for title, _, _ in file_record['entries']
+        ]
+        self._write_tags_file(file_records, titles)
+        generation = urandom(8)
+        self._write_cache(file_records, generation)
+        self._write_word_index(file_records, generation)
+        self._write_reference_graph(file_records, titles, generation)
+        if not self._read_cache():
+            self._load_file_records(file_records)
         return errors
 
 
 # utility functions
 
 
+def parse_entries(text):
+    # type: (str) -> list[tuple[str, int, str]]
+    """Split the contents of a journal file into entries.
+
+    Parameters:
+        text: The contents of the journal file.
+
+    Returns:
+        list[tuple[str, int, str]]: The title, line number, and text of each entry.
+    """
+    entries = []
+    line_num = 1
+    for raw_entry in text.strip().split('\n\n'):
+        if not raw_entry.strip():
+            continue
+        lines = raw_entry.splitlines()
+        entries.append((lines[0], line_num, raw_entry))
+        line_num += len(lines) + 1
+    return entries
+
+
+def text_stats(text):
+    # type: (str) -> EntryStats
+    """Calculate the statistics of the text of an entry.
+
+    Parameters:
+        text: The text of the entry.
+
+    Returns:
+        EntryStats: The statistics of the entry.
+    """
+    lines = text.splitlines()
+    plain_text = NON_ALNUM_REGEX.sub(' ', text.replace("'", ''))
+    # splitting a line on '. ', '! ', and '? ' adds one sentence per separator
+    num_sentences = 0
+    for line in lines:
+        line = line.strip()
+        if line:
+            num_sentences += 1 + line.count('. ') + line.count('! ') + line.count('? ')
+    return EntryStats(
+        num_chars=len(text),
+        num_words=len(text.split()),
+        num_plain_words=len(plain_text.split()),
+        # only letters, digits, and spaces are left in the plain text
+        num_letters=len(plain_text) - plain_text.count(' '),
+        num_sentences=num_sentences,
+        max_line_len=max((len(line) for line in lines), default=0),
+        num_refs=len(REFERENCE_REGEX.findall(text)),
+    )
+
+
+def text_words(text):
+    # type: (str) -> list[str]
+    """Find the words of the text of an entry, for the word index.
+
+    Parameters:
+        text: The text of the entry.
+
+    Returns:
+        list[str]: The distinct lowercased words of the entry.
+    """
+    return list(set(WORD_REGEX.findall(text.lower())))
+
+
+def text_dates(text):
+    # type: (str) -> list[int]
+    """Find the dates referenced in the text of an entry, for the reference graph.
+
+    Parameters:
+        text: The text of the entry.
+
+    Returns:
+        list[int]: The distinct ordinals of the valid referenced dates.
+    """
+    titles = set(Title(reference) for reference in REFERENCE_REGEX.findall(text))
+    return [title.ordinal for title in titles if title.is_date]
+
+
+def map_journal_files(function, journal_files, *args):
+    # type: (Callable[..., MapResult], list[Path], Iterable[Any]) -> list[MapResult]
+    """Apply a function to journal files, in parallel if they are large enough.
+
+    Parameters:
+        function: The function, which must be picklable.
+        journal_files: The journal files.
+        *args: Further arguments to map the function over.
+
+    Returns:
+        list[Any]: The result for each journal file.
+    """
+    if (
+        len(journal_files) > 1
+        and (cpu_count() or 1) > 1
+        and sum(journal_file.stat().st_size for journal_file in journal_files) >= PARALLEL_MIN_SIZE
+    ):
+        with ProcessPoolExecutor() as executor:
+            return list(executor.map(function, journal_files, *args))
+    return list(map(function, journal_files, *args))
+
+
+def lint_file(journal_file, lines):
+    # type: (Path, list[str]) -> list[tuple[int, str]]
+    """Check a single journal file for errors.
+
+    Errors that depend on other files (duplicate titles and inconsistent
+    date formats) are checked by lint_titles instead.
+
+    Parameters:
+        journal_file: The journal file.
+        lines: The lines of the journal file.
+
+    Returns:
+        list[tuple[int, str]]: A list of line numbers and errors.
+    """
+    ascii_regex = re.compile('(\t*[!-~]([ -~]*[!-~])?)?')
+    errors = [] # type: list[tuple[int, str]]
+    stem = journal_file.stem
+    has_date_stem = RANGE_BOUND_REGEX.fullmatch(stem)
+    if lines[0].startswith('\ufeff'):
+        errors.append((1, 'byte order mark'))
+    elif lines[0].strip() == '':
+        errors.append((1, 'file starts on blank line'))
+    if lines[-1].strip() == '':
+        errors.append((len(lines), 'file ends on blank line'))
+    prev_indent = 0
+    prev_line = ''
+    for line_num, line in enumerate(lines, start=1):
+        indent = len(line) - len(line.lstrip('\t'))
+        if not ascii_regex.fullmatch(line):
+            errors.append(
+                (line_num, 'non-tab indentation, trailing whitespace, or non-ASCII character')
+            )
+        line = line.strip()
+        if not line.startswith('|') and '  ' in line:
+            errors.append((line_num, 'multiple spaces'))
+        if indent == 0:
+            if line:
+                if prev_indent != 0 or prev_line != '':
+                    errors.append((line_num, 'no blank line between entries'))
+                if DATE_REGEX.fullmatch(line):
+                    if not title_to_date(line).strftime('%Y-%m-%d, %A').startswith(line):
+                        errors.append((line_num, 'date-weekday correctness'))
+                    if has_date_stem and not line.startswith(stem):
+                        errors.append((line_num, "filename doesn't match entry"))
+            elif prev_indent == 0:
+                errors.append((line_num, 'consecutive unindented lines'))
+        elif indent - prev_indent > 1:
+            errors.append((line_num, 'unexpected indentation'))
+        prev_indent = indent
+        prev_line = line
+    return errors
+
+
+def lint_journal_file(journal_file):
+    # type: (Path) -> Optional[FileLint]
+    """Read and lint a journal file, without calculating any entry metadata.
+
+    Parameters:
+        journal_file: The journal file.
+
+    Returns:
+        Optional[FileLint]: The line numbers and errors of the file, and the
+            title and line number of each entry, or None if the file is empty.
+    """
+    text = journal_file.read_text()
+    lines = text.splitlines()
+    if not lines:
+        return None
+    titles = [(title, line_num) for title, line_num, _ in parse_entries(text)]
+    return lint_file(journal_file, lines), titles
+
+
+def lint_titles(titles_by_file):
+    # type: (list[tuple[Path, list[tuple[str, int]]]]) -> list[tuple[Path, int, str]]
+    """Check the entry titles of all journal files for duplicates and date formats.
+
+    Parameters:
+        titles_by_file: The title and line number of each entry, by journal file.
+
+    Returns:
+        list[tuple[Path, int, str]]: A list of errors.
+    """
+    errors = [] # type: list[tuple[Path, int, str]]
+    seen = set()
+    long_dates = None
+    for journal_file, file_titles in titles_by_file:
+        for title, line_num in file_titles:
+            if DATE_REGEX.fullmatch(title):
+                if long_dates is None:
+                    long_dates = (len(title) > DATE_LENGTH)
+                elif long_dates != (len(title) > DATE_LENGTH):
+                    errors.append((journal_file, line_num, 'inconsistent date format'))
+            if title in seen:
+                errors.append((journal_file, line_num, 'duplicate titles'))
+            seen.add(title)
+    return errors
+
+
+def read_file_record(journal_file, old_hash=None):
+    # type: (Path, Optional[str]) -> Optional[FileRecord]
+    """Read and parse a journal file.
+
+    The file is expected to have been linted by lint_journal_file.
+
+    Parameters:
+        journal_file: The journal file.
+        old_hash: The previous content hash of the file. Optional.
+
+    Returns:
+        FileRecord: The hash and entries of the file, with the text of
+            each entry as UTF-8, or only the hash if it matches old_hash, or
+            None if the file is empty.
+    """
+    contents = journal_file.read_bytes()
+    file_hash = sha256(contents).hexdigest()
+    if file_hash == old_hash:
+        return {'hash': file_hash}
+    text = contents.decode('utf-8')
+    if not text.splitlines():
+        return None
+    entries = parse_entries(text)
+    return {
+        'hash': file_hash,
+        'entries': [
+            (title, line_num, entry_text.encode('utf-8'))
+            for title, line_num, entry_text in entries
+        ],
+        'stats': [text_stats(entry_text) for _, _, entry_text in entries],
+        'words': [text_words(entry_text) for _, _, entry_text in entries],
+        'dates': [text_dates(entry_text) for _, _, entry_text in entries],
+    }
+
+
+def write_encrypted_archive(encrypted_path, add_members):
+    # type: (Path, Callable[[TarFile], None]) -> None
+    """Stream a tarball through xz into gpg, without writing plaintext to disk.
+
+    The tarball is compressed by a multi-threaded xz if it is installed, and
+    by the single-threaded lzma module otherwise. If adding the members fails
+    or is interrupted, xz and gpg are terminated and the partial archive is
+    removed.
+
+    Parameters:
+        encrypted_path: The path of the encrypted archive.
+        add_members: A function that adds members to the tarball.
+
+    Raises:
+        CalledProcessError: If xz or gpg fails.
+    """
+    gpg_args = ['gpg', '--encrypt', '--output', str(encrypted_path), '--recipient', 'justinnhli']
+    # xz is optional, so the processes are entered on a stack, which waits on them in reverse
+    with ExitStack() as stack:
+        processes = [stack.enter_context(Popen(gpg_args, stdin=PIPE))]
+        tar_mode = 'w|' # type: Literal['w|', 'w|xz']
+        if which('xz') is None:
+            tar_mode = 'w|xz'
+        else:
+            processes.append(stack.enter_context(
+                Popen(['xz', '-T0', '--stdout'], stdin=PIPE, stdout=processes[0].stdin)
+            ))
+            processes[0].stdin.close()
+        pipe = processes[-1].stdin
+        progress = ProgressWriter(pipe)
+        try:
+            with open_tar_file(fileobj=progress, mode=tar_mode) as tar:
+                add_members(tar)
+        except BaseException:
+            # stop the processes before closing their input, so gpg cannot finish a truncated
+            # archive; the input is closed here, so leaving the stack cannot raise over the error
+            for process in processes:
+                process.terminate()
+                process.wait()
+            try:
+                pipe.close()
+            except OSError:
+                pass
+            encrypted_path.unlink(missing_ok=True)
+            raise
+        pipe.close()
+    for process in processes:
+        if process.returncode != 0:
+            encrypted_path.unlink(missing_ok=True)
+            raise CalledProcessError(process.returncode, process.args)
+    progress.report()
+
+
+def check_archive_chain(archive_name, manifest, prev_stem):
+    # type: (str, Optional[dict[str, Any]], Optional[str]) -> None
+    """Exit with an error if an archive cannot be replayed after the previous one.
+
+    The first archive must be a full archive, and each later archive must be
+    an incremental archive of the one before it.
+
+    Parameters:
+        archive_name: The file name of the archive.
+        manifest: The manifest of the archive, or None if it has none.
+        prev_stem: The stem of the previous archive, or None if this is the first.
+    """
+    if prev_stem is None:
+        if manifest is not None and manifest['parent'] is not None:
+            print(
+                f'{archive_name} is incremental; start with the archive of {manifest["parent"]}',
+                file=stderr,
+            )
+            sys_exit(1)
+    elif manifest is None or manifest['parent'] != prev_stem:
+        print(f'{archive_name} does not follow {prev_stem}', file=stderr)
+        sys_exit(1)
+
+
+def write_all(fd, data):
+    # type: (int, Union[bytes, memoryview]) -> None
+    """Write all of the data to a file descriptor.
+
+    Parameters:
+        fd: The file descriptor to write to.
+        data: The data to write.
+    """
+    with memoryview(data) as view:
+        written = 0
+        while written < len(view):
+            written += write_fd(fd, view[written:])
+
+
+def replace_file(filepath, *chunks):
+    # type: (Path, Union[bytes, bytearray]) -> None
+    """Write a file by renaming a complete temporary file over it.
+
+    Processes that have the old file open or memory-mapped keep reading the
+    old contents instead of a partially written file.
+
+    Parameters:
+        filepath: The file to write.
+        *chunks: The data to write.
+    """
+    temp_fd, temp_path = mkstemp(prefix=f'{filepath.name}.', dir=filepath.parent)
+    # mkstemp creates the file as owner-only; use the permissions open() would
+    mask = umask(0)
+    umask(mask)
+    try:
+        chmod(temp_path, 0o666 & ~mask)
+        with open(temp_fd, 'wb') as fd:
+            for chunk in chunks:
+                fd.write(chunk)
+        replace(temp_path, filepath)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+
+
 def title_to_date(title):
     # type: (str) -> datetime
     """Convert an entry title to a datetime.
@@ -371,7 +2137,7 @@ def title_to_date(title):
         datetime: The datetime.
     """
     if DATE_REGEX.fullmatch(title):
-        return datetime.strptime(title[:DATE_LENGTH], '%Y-%m-%d')
+        return datetime.fromisoformat(title[:DATE_LENGTH])
     else:
         return datetime.today()
 
@@ -410,54 +2176,137 @@ def filter_entries(journal, args, **kwargs):
     )
 
 
+def query_entries(journal, args, **kwargs):
+    # type: (Journal, Namespace, Any) -> JournalQuery
+    """Build an ordered, limited query from the CLI arguments.
+
+    Parameters:
+        journal: The journal.
+        args: The CLI arguments.
+        **kwargs: Override values for the CLI arguments.
+
+    Returns:
+        JournalQuery: The query.
+    """
+    query = journal.query().of_type(kwargs.get('title_type', args.title_type))
+    date_ranges = kwargs.get('date_ranges', args.date_ranges)
+    if date_ranges:
+        query = query.in_dates(*date_ranges)
+    terms = kwargs.get('terms', args.terms)
+    if terms:
+        query = query.matching(
+            terms,
+            kwargs.get('icase', args.icase),
+            kwargs.get('whole_words', args.whole_words),
+        )
+    query = query.ordered(kwargs.get('reverse', args.reverse))
+    return query.limit(kwargs.get('limit', args.limit))
+
+
 def group_entries(entries, unit, summary=True, reverse=True):
-    # type: (Entries, str, bool, bool) -> dict[str, Entries]
+    # type: (Mapping[Title, EntryValue], str, bool, bool) -> dict[str, Mapping[Title, EntryValue]]
     """Group entries by date.
 
     Parameters:
-        entries: The entries.
+        entries: The entries, or any other values by title.
         unit: The tabulation unit. One of 'year', 'month', or 'day'.
         summary: Whether to include a summary. Defaults to True.
         reverse: Whether to list entries in chronological order.
             Defaults to True.
 
     Returns:
-        dict[str, Entries]: The grouped entries.
+        dict[str, Mapping[Title, EntryValue]]: The grouped entries.
     """
 
     def _key_func(entry):
-        # type: (tuple[Title, Entry]) -> str
+        # type: (tuple[Title, EntryValue]) -> str
         return entry[0].iso(unit, 'other')
 
     grouped = groupby(
         sorted(entries.items(), reverse=reverse, key=_key_func),
         _key_func,
     )
-    result = {group: dict(entries) for group, entries in grouped} # type: dict[str, Entries]
+    result = {
+        group: dict(entries) for group, entries in grouped
+    } # type: dict[str, Mapping[Title, EntryValue]]
     if summary:
         result['all'] = entries
     return result
 
 
-def sort_entries(entries, key_func=None, reverse=True):
-    # type: (Iterable[Entry], Callable[[Entry], Any], bool) -> list[Entry]
-    """Sort entries lexicographically, but always put date entries first.
+def tabulate_counts(stats_map, unit, summary=True, reverse=True):
+    # type: (Mapping[Title, EntryStats], str, bool, bool) -> list[Sequence[Any]]
+    """Calculate the default -C columns with NumPy.
 
     Parameters:
-        entries: The entries to sort.
-        key_func: The key to sort by.
-        reverse: Whether to sort in reverse.
+        stats_map: The statistics of the date entries.
+        unit: The tabulation unit. One of 'year', 'month', or 'day'.
+        summary: Whether to include a summary. Defaults to True.
+        reverse: Whether to list entries in chronological order.
+            Defaults to True.
 
     Returns:
-        list[Entry]: The sorted list of entries
+        list[Sequence[Any]]: The rows of the table.
     """
-    grouped_entries = defaultdict(list)
-    for entry in entries:
-        grouped_entries[entry.title.is_date].append(entry)
-    return (
-        sorted(grouped_entries[True], key=key_func, reverse=reverse)
-        + sorted(grouped_entries[False], key=key_func, reverse=reverse)
+    titles = sorted(stats_map)
+    dates = [title.date for title in titles]
+    ordinals = np.array([title.ordinal for title in titles], dtype=np.int64)
+    num_words = np.array([stats_map[title].num_words for title in titles], dtype=np.int64)
+    sizes = np.array([stats_map[title].num_chars for title in titles], dtype=np.int64)
+    if unit == 'year':
+        keys = np.array([date.year for date in dates], dtype=np.int64)
+    elif unit == 'month':
+        keys = np.array([12 * date.year + date.month for date in dates], dtype=np.int64)
+    else:
+        keys = ordinals
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    labels = [titles[start].iso(unit) for start in starts]
+    if summary:
+        # append a copy of all the entries as a final group
+        starts = np.r_[starts, len(titles)]
+        ordinals = np.r_[ordinals, ordinals]
+        num_words = np.r_[num_words, num_words]
+        sizes = np.r_[sizes, sizes]
+        labels.append('all')
+    counts = np.diff(np.r_[starts, len(ordinals)])
+    group_ids = np.repeat(np.arange(len(starts)), counts)
+    # sort words within each group to find medians
+    sorted_words = num_words[np.lexsort((num_words, group_ids))]
+    means = np.add.reduceat(num_words, starts) / counts
+    deviations = np.add.reduceat((num_words - means[group_ids]) ** 2, starts)
+    columns = zip(
+        labels,
+        counts,
+        np.minimum.reduceat(ordinals, starts),
+        np.maximum.reduceat(ordinals, starts),
+        np.add.reduceat(sizes, starts),
+        np.add.reduceat(num_words, starts),
+        np.minimum.reduceat(num_words, starts),
+        (sorted_words[starts + (counts - 1) // 2] + sorted_words[starts + counts // 2]) / 2,
+        np.maximum.reduceat(num_words, starts),
+        means,
+        deviations,
     )
+    table = [] # type: list[Sequence[Any]]
+    for label, count, first, last, size, words, min_, med, max_, mean_, deviation in columns:
+        table.append([
+            label,
+            int(count),
+            f'{(int(last) - int(first) + 1) / int(count):.2f}',
+            f'{int(size):,d}',
+            f'{int(words):,d}',
+            int(min_),
+            round(float(med)),
+            int(max_),
+            round(float(mean_)),
+            0 if count <= 1 else round(float(np.sqrt(deviation / (count - 1)))),
+        ])
+    if reverse:
+        if summary:
+            table[:-1] = table[-2::-1]
+        else:
+            table.reverse()
+    return table
 
 
 def print_table(data, headers=None, gap_size=2):
@@ -476,104 +2325,50 @@ def print_table(data, headers=None, gap_size=2):
         rows = [headers] + rows
     widths = [max(len(row[col]) for row in rows) for col in range(len(rows[0]))]
     gap = gap_size * ' '
-    if headers:
-        print(gap.join(col.center(width) for width, col in zip(widths, headers)))
-        print(gap.join(width * '-' for width in widths))
-        rows = rows[1:]
-    for row in rows:
-        print(gap.join(col.rjust(width) for width, col in zip(widths, row)))
+    with PHASES.start('output'):
+        if headers:
+            print(gap.join(col.center(width) for width, col in zip(widths, headers)))
+            print(gap.join(width * '-' for width in widths))
+            rows = rows[1:]
+        for row in rows:
+            print(gap.join(col.rjust(width) for width, col in zip(widths, row)))
 
 
-def summarize_line_lengths(entries, _1, _2):
-    # type: (Entries, str, Sequence[int]) -> int
+def summarize_line_lengths(_1, _2, stats):
+    # type: (Mapping[Title, EntryStats], str, EntryStats) -> int
     """Get the length of the longest line of a group of entries.
 
     Parameters:
-        entries: The entries.
+        stats: The statistics of the entries.
 
     Returns:
         The length of longest line.
     """
-    text = '\n'.join(entry.text for entry in entries.values())
-    return max(len(line) for line in text.splitlines())
+    return max(stats.max_line_len)
 
 
-def summarize_readability(entries, _1, _2):
-    # type: (Entries, str, Sequence[int]) -> str
+def summarize_readability(_1, _2, stats):
+    # type: (Mapping[Title, EntryStats], str, EntryStats) -> str
     """Calculate the Kincaid reading grade level of a group of entries.
 
     Parameters:
-        entries: The entries.
+        stats: The statistics of the entries.
 
     Returns:
         str: The reading grade level.
     """
-    non_alnum_regex = re.compile('[^ 0-9A-Za-z]')
-    multispace_regex = re.compile('  +')
-
-    def _to_sentences(text):
-        # type: (str) -> chain[str]
-        for paragraph in text.splitlines():
-            paragraph = paragraph.strip()
-            if not paragraph:
-                continue
-            sentences = chain(*(sentence.split('! ') for sentence in paragraph.split('. ')))
-            sentences = chain(*(sentence.split('? ') for sentence in sentences))
-            yield from sentences
-
-    def _strip_punct(text):
-        # type: (str) -> str
-        text = text.replace("'", '')
-        text = non_alnum_regex.sub(' ', text)
-        text = multispace_regex.sub(' ', text)
-        return text.strip()
 
     def _letters_to_syllables(letters):
         # type: (int) -> float
         return letters / 3.26 # constant updated 2021-07-14
 
-    def _kincaid(text):
-        # type: (str) -> float
-        sentences = [_strip_punct(sentence) for sentence in _to_sentences(text)]
-        words = _strip_punct(text).split()
-        num_letters = sum(len(word) for word in words)
-        num_words = len(words)
-        num_sentences = len(sentences)
-        return (
-            0.39 * (num_words / num_sentences)
-            + 11.8 * (_letters_to_syllables(num_letters) / num_words)
-            - 15.59
-        )
-
-    text = '\n'.join(entry.text for entry in entries.values())
-    return f'{_kincaid(text):.3f}'
-
-
-def log_error(message):
-    # type: (str) -> tuple[Path, int, str]
-    """Create the log error message.
-
-    Parameters:
-        message: The error message.
-
-    Returns:
-        Path: The journal file where the error occurred.
-        int: The line where the error occurred.
-        str: The error message.
-    """
-    frame = currentframe()
-    assert frame, 'Python does not support frame introspection'
-    frame = frame.f_back
-    journal_file = None
-    line_num = None
-    while True:
-        local_vars = frame.f_locals
-        if 'journal_file' in local_vars and 'line_num' in local_vars:
-            journal_file = local_vars['journal_file']
-            line_num = local_vars['line_num']
-            break
-        frame = frame.f_back
-    return (journal_file, line_num, message)
+    num_words = sum(stats.num_plain_words)
+    kincaid = (
+        0.39 * (num_words / sum(stats.num_sentences))
+        + 11.8 * (_letters_to_syllables(sum(stats.num_letters)) / num_words)
+        - 15.59
+    )
+    return f'{kincaid:.3f}'
 
 
 # operations
@@ -587,16 +2382,11 @@ COUNT_COL_FNS = {
     'READABILITY': ('readability', summarize_readability),
 }
 GRAPH_NODE_FNS = {
-    'uniform': (lambda entries, node: 48),
-    'length': (lambda entries, node: len(entries[node].text.split()) / 100),
-    'cites': (lambda entries, node:
-        5 * (1 + sum(
-            1 for entry in entries.values()
-            if entry.text > node and node in entry.text
-        ))
-    ),
-    'refs': (lambda entries, node: 5 * len(REFERENCE_REGEX.findall(entries[node].text))),
-}
+    'uniform': (lambda stats: 48),
+    'length': (lambda stats: stats.num_words / 100),
+    'cites': (lambda stats: 5 * (1 + stats.num_cites)),
+    'refs': (lambda stats: 5 * stats.num_refs),
+} # type: dict[str, Callable[[NodeStats], float]]
 
 
 def register(flag=None):
@@ -632,63 +2422,130 @@ def do_archive(_, args):
     # type: (Journal, Namespace) -> None
     """Archive to a tarball.
 
+    Every archive starts with a manifest of the hashes of its files. With
+    --incremental, only files that were added or modified since the last
+    archive are included.
+
     Parameters:
         args: The CLI arguments.
     """
     from os.path import basename, join as join_path # pylint: disable = import-outside-toplevel
 
+    def _is_archivable(path):
+        # type: (Path) -> bool
+        return path.name[0] not in '._' and path.lstat().st_size <= 1048576
+
+    def _hash_files(directory, prefix=''):
+        # type: (Path, str) -> None
+        for path in sorted(directory.iterdir()):
+            if not _is_archivable(path):
+                continue
+            if path.is_dir() and not path.is_symlink():
+                _hash_files(path, f'{prefix}{path.name}/')
+            elif path.is_file() and not path.is_symlink():
+                file_hashes[prefix + path.name] = sha256(path.read_bytes()).hexdigest()
+
     def _tarinfo_filter(tarinfo):
         # type: (TarInfo) -> TarInfo
         if basename(tarinfo.name)[0] in '._':
             return None
         elif tarinfo.size > 1048576:
             return None
+        elif tarinfo.isfile() and tarinfo.name[len(archive_stem) + 1:] not in changed:
+            return None
         else:
             return tarinfo
 
-    archive_stem = 'jrnl' + datetime.now().strftime('%Y%m%d%H%M%S')
-    archive_path = Path() / f'{archive_stem}.txz'
-    with open_tar_file(archive_path, 'w:xz') as tar:
+    def _add_members(tar):
+        # type: (TarFile) -> None
+        data = json_to_str(manifest).encode('utf-8')
+        tarinfo = TarInfo(join_path(archive_stem, ARCHIVE_MANIFEST_FILENAME))
+        tarinfo.size = len(data)
+        tarinfo.mtime = int(datetime.now().timestamp())
+        tar.addfile(tarinfo, BytesIO(data))
         tar.add(args.directory, arcname=archive_stem, filter=_tarinfo_filter)
-        tar.add(__file__, arcname=join_path(archive_stem, basename(__file__)))
-    encrypted_path = archive_path.with_suffix('.txz.gpg')
-    run(
-        [
-            'gpg',
-            '--encrypt',
-            '--output', str(encrypted_path),
-            '--recipient', 'justinnhli',
-            str(archive_path)
-        ],
-        check=True,
+        if basename(__file__) in changed:
+            tar.add(script_path, arcname=join_path(archive_stem, basename(__file__)))
+
+    archive_stem = 'jrnl' + datetime.now().strftime('%Y%m%d%H%M%S')
+    manifest_file = args.directory / ARCHIVE_MANIFEST_FILENAME
+    prev_manifest = {} # type: dict[str, Any]
+    if args.incremental and manifest_file.exists():
+        prev_manifest = json_from_str(manifest_file.read_text(encoding='utf-8'))
+    file_hashes = {} # type: dict[str, str]
+    _hash_files(args.directory)
+    script_path = Path(__file__).resolve()
+    file_hashes[basename(__file__)] = sha256(script_path.read_bytes()).hexdigest()
+    prev_hashes = prev_manifest.get('files', {})
+    changed = set(
+        rel_path for rel_path, file_hash in file_hashes.items()
+        if prev_hashes.get(rel_path) != file_hash
     )
-    archive_path.unlink()
+    manifest = {
+        'archive': archive_stem,
+        'parent': prev_manifest.get('archive'),
+        'files': file_hashes,
+    }
+    write_encrypted_archive(Path() / f'{archive_stem}.txz.gpg', _add_members)
+    manifest_file.write_text(json_to_str(manifest), encoding='utf-8')
 
 
 @register('-U')
 def do_unarchive(_, args):
     # type: (Journal, Namespace) -> None
-    """Unarchive from a tarball.
+    """Unarchive from a tarball, or replay a base and incremental tarballs.
+
+    The tarballs must be given in the order they were created. The contents
+    of incremental tarballs are extracted into the directory of the first
+    tarball, and files that were deleted between archives are removed. Each
+    tarball is decrypted and extracted as a stream, without a temporary file.
 
     Parameters:
         args: The CLI arguments.
     """
-    assert len(args.terms) == 1
-    encrypted_path = Path(args.terms[0]).expanduser().resolve()
-    assert encrypted_path.exists()
-    archive_path = encrypted_path.with_suffix('')
-    run(
-        [
-            'gpg',
-            '--decrypt',
-            '--output', str(archive_path),
-            str(encrypted_path),
-        ],
-        check=True,
-    )
-    with open_tar_file(archive_path) as tar:
-        tar.extractall(path=args.directory)
-    archive_path.unlink()
+    prev_files = set() # type: set[str]
+    prev_stem = None # type: Optional[str]
+    target_stem = None # type: Optional[str]
+    for term in args.terms:
+        encrypted_path = Path(term).expanduser().resolve()
+        assert encrypted_path.exists()
+        stem = None # type: Optional[str]
+        manifest = None # type: Optional[dict[str, Any]]
+        with Popen(['gpg', '--decrypt', str(encrypted_path)], stdout=PIPE) as gpg:
+            try:
+                with open_tar_file(fileobj=gpg.stdout, mode='r|xz') as tar:
+                    for member in tar:
+                        if args.list_members:
+                            print(member.name)
+                            continue
+                        if stem is None:
+                            # the manifest, if any, is always the first member
+                            stem, _separator, rel_name = member.name.partition('/')
+                            if rel_name == ARCHIVE_MANIFEST_FILENAME:
+                                manifest_data = tar.extractfile(member).read()
+                                manifest = json_from_str(manifest_data.decode('utf-8'))
+                            check_archive_chain(encrypted_path.name, manifest, prev_stem)
+                            target_stem = target_stem or stem
+                            if manifest is not None:
+                                manifest_file = args.directory / target_stem / rel_name
+                                manifest_file.parent.mkdir(parents=True, exist_ok=True)
+                                manifest_file.write_text(json_to_str(manifest), encoding='utf-8')
+                                continue
+                        member.name = target_stem + member.name[len(stem):]
+                        tar.extract(member, path=args.directory)
+            except TarError:
+                # a failed decryption shows up as a truncated tarball
+                gpg.stdout.close()
+                if gpg.wait() != 0:
+                    raise CalledProcessError(gpg.returncode, gpg.args) from None
+                raise
+        if gpg.returncode != 0:
+            raise CalledProcessError(gpg.returncode, gpg.args)
+        files = set() if manifest is None else set(manifest['files'])
+        for rel_path in prev_files - files:
+            (args.directory / target_stem / rel_path).unlink(missing_ok=True)
+        prev_files = files
+        prev_stem = stem
 
 
 @register('-C')
@@ -701,34 +2558,40 @@ def do_count(journal, args):
         args: The CLI arguments.
     """
     columns = {
-        'DATE': (lambda entries, unit, num_words: unit),
-        'COUNT': (lambda entries, unit, num_words: len(entries)),
-        'FREQ': (lambda entries, unit, num_words:
+        'DATE': (lambda entries, unit, stats: unit),
+        'COUNT': (lambda entries, unit, stats: len(entries)),
+        'FREQ': (lambda entries, unit, stats:
             f'{((max(entries).date - min(entries).date).days + 1) / len(entries):.2f}'
         ),
-        'SIZE': (lambda entries, unit, num_words:
-            f'{sum(len(entries[date].text) for date in entries):,d}'
+        'SIZE': (lambda entries, unit, stats: f'{sum(stats.num_chars):,d}'),
+        'WORDS': (lambda entries, unit, stats: f'{sum(stats.num_words):,d}'),
+        'MIN': (lambda entries, unit, stats: min(stats.num_words)),
+        'MED': (lambda entries, unit, stats: round(median(stats.num_words))),
+        'MAX': (lambda entries, unit, stats: max(stats.num_words)),
+        'MEAN': (lambda entries, unit, stats: round(mean(stats.num_words))),
+        'STDEV': (lambda entries, unit, stats:
+            0 if len(stats.num_words) <= 1 else round(stdev(stats.num_words))
         ),
-        'WORDS': (lambda entries, unit, num_words: f'{sum(num_words):,d}'),
-        'MIN': (lambda entries, unit, num_words: min(num_words)),
-        'MED': (lambda entries, unit, num_words: round(median(num_words))),
-        'MAX': (lambda entries, unit, num_words: max(num_words)),
-        'MEAN': (lambda entries, unit, num_words: round(mean(num_words))),
-        'STDEV': (lambda entries, unit, num_words:
-            0 if len(num_words) <= 1 else round(stdev(num_words))
-        ),
-    } # type: dict[str, Callable[[Entries, str, Sequence[int]], Any]]
-    entries = filter_entries(journal, args, title_type='date')
-    if not entries:
+    } # type: dict[str, Callable[[Mapping[Title, EntryStats], str, EntryStats], Any]]
+    # only the statistics are needed, so the text of the entries is never decoded
+    stats_map = {
+        title: journal.entry_stats(title)
+        for title in query_entries(journal, args, title_type='date', limit=None).titles()
+    }
+    if not stats_map:
+        return
+    if np is not None and not args.columns:
+        count_table = tabulate_counts(stats_map, args.unit, args.summary, args.reverse)
+        print_table(count_table, (list(columns.keys()) if args.headers else []))
         return
     for heading, (flag, function) in COUNT_COL_FNS.items():
         if flag in args.columns:
             columns[heading] = function
-    length_map = {title: len(entry.text.split()) for title, entry in entries.items()}
-    table = [] # type: list[Sequence[str]]
-    for timespan, group in group_entries(entries, args.unit, args.summary, args.reverse).items():
-        lengths = tuple(length_map[title] for title in group)
-        table.append([func(group, timespan, lengths) for column, func in columns.items()])
+    table = [] # type: list[Sequence[Any]]
+    for timespan, group in group_entries(stats_map, args.unit, args.summary, args.reverse).items():
+        # transpose the statistics of the group, so each field is a tuple of values
+        stats = EntryStats(*zip(*(stats_map[title] for title in group)))
+        table.append([func(group, timespan, stats) for column, func in columns.items()])
     print_table(table, (list(columns.keys()) if args.headers else []))
 
 
@@ -742,57 +2605,68 @@ def do_graph(journal, args):
         args: The CLI arguments.
     """
     entries = filter_entries(journal, args, title_type='date')
-    disjoint_sets = dict((k, k) for k in entries)
-    referents = defaultdict(set) # type: dict[Title, set[Title]]
+    nodes = sorted(entries)
+    node_indices = {node: index for index, node in enumerate(nodes)}
+    disjoint_sets = DisjointSets(len(nodes))
     edges = defaultdict(set) # type: dict[Title, set[Title]]
-    for src, entry in sorted(entries.items()):
-        dests = set(Title(dest) for dest in REFERENCE_REGEX.findall(entry.text))
-        dests = set(
-            dest for dest in dests
-            if src > dest and dest in entries
-        )
-        referents[src].update(*(referents[dest] for dest in dests))
+    num_refs = {} # type: dict[Title, int]
+    num_cites = defaultdict(int) # type: dict[Title, int]
+    # bitsets of the nodes reachable from each node, by node index
+    reachable = {} # type: dict[Title, int]
+    for src in nodes:
+        num_refs[src], references = journal.references(src)
+        dests = set(dest for dest in references if dest in entries)
+        for dest in dests:
+            num_cites[dest] += 1
         outgoing_edges = dests
         if args.simplify_edges:
-            outgoing_edges -= referents[src]
+            transitive = 0
+            for dest in dests:
+                transitive |= reachable[dest]
+            outgoing_edges = set(
+                dest for dest in dests
+                if not transitive & (1 << node_indices[dest])
+            )
+            for dest in dests:
+                transitive |= 1 << node_indices[dest]
+            reachable[src] = transitive
         for dest in outgoing_edges:
             edges[src].add(dest)
-            while disjoint_sets[dest] != src:
-                disjoint_sets[dest], dest = src, disjoint_sets[dest]
-        referents[src] |= dests
-    components = defaultdict(set) # type: dict[Title, set[Title]]
-    for rep in disjoint_sets:
-        path = set([rep])
-        while disjoint_sets[rep] != rep:
-            path.add(rep)
-            rep = disjoint_sets[rep]
-        components[rep] |= path
-    node_fn = GRAPH_NODE_FNS[args.node_size_fn] # type: Callable[[Entries, Title], float]
-    print('digraph {')
-    print('\tgraph [size="48", model="subset", rankdir="BT"];')
-    print('\tnode [fontcolor="#4E9A06", shape="none"];')
-    print('\tedge [color="#555753"];')
-    print('')
-    for srcs in sorted(components.values(), key=(lambda s: (len(s), min(s))), reverse=True):
-        print(f'\t// component size = {len(srcs)}')
-        node_lines = defaultdict(set)
-        edge_lines = set()
-        for src in srcs:
-            node_lines[src.iso()].add(
-                f'"{src.iso()}" [fontsize="{node_fn(entries, src)}"];'
-            )
-            for dest in edges[src]:
-                edge_lines.add(f'"{src.iso()}" -> "{dest.iso()}";')
-        for _, entry_lines in sorted(node_lines.items(), reverse=args.reverse):
-            print('\tsubgraph {')
-            print('\t\trank="same";')
-            for entry_line in sorted(entry_lines, reverse=args.reverse):
-                print('\t\t' + entry_line)
-            print('\t}')
-        for edge_line in sorted(edge_lines, reverse=args.reverse):
-            print('\t' + edge_line)
+            disjoint_sets.union(node_indices[src], node_indices[dest])
+    components = defaultdict(set) # type: dict[int, set[Title]]
+    for index, node in enumerate(nodes):
+        components[disjoint_sets.find(index)].add(node)
+    node_fn = GRAPH_NODE_FNS[args.node_size_fn]
+    node_stats = {
+        node: NodeStats(journal.entry_stats(node).num_words, num_refs[node], num_cites[node])
+        for node in entries
+    }
+    with PHASES.start('output'):
+        print('digraph {')
+        print('\tgraph [size="48", model="subset", rankdir="BT"];')
+        print('\tnode [fontcolor="#4E9A06", shape="none"];')
+        print('\tedge [color="#555753"];')
         print('')
-    print('}')
+        for srcs in sorted(components.values(), key=(lambda s: (len(s), min(s))), reverse=True):
+            print(f'\t// component size = {len(srcs)}')
+            node_lines = defaultdict(set)
+            edge_lines = set()
+            for src in srcs:
+                node_lines[src.iso()].add(
+                    f'"{src.iso()}" [fontsize="{node_fn(node_stats[src])}"];'
+                )
+                for dest in edges[src]:
+                    edge_lines.add(f'"{src.iso()}" -> "{dest.iso()}";')
+            for _, entry_lines in sorted(node_lines.items(), reverse=args.reverse):
+                print('\tsubgraph {')
+                print('\t\trank="same";')
+                for entry_line in sorted(entry_lines, reverse=args.reverse):
+                    print('\t\t' + entry_line)
+                print('\t}')
+            for edge_line in sorted(edge_lines, reverse=args.reverse):
+                print('\t' + edge_line)
+            print('')
+        print('}')
 
 
 @register('-I')
@@ -818,11 +2692,8 @@ def do_list(journal, args):
         journal: The journal.
         args: The CLI arguments.
     """
-    entries = filter_entries(journal, args)
-    print('\n'.join(
-        str(entry.title) for entry
-        in sort_entries(entries.values(), reverse=args.reverse)
-    ))
+    with PHASES.start('output'):
+        print('\n'.join(str(entry.title) for entry in query_entries(journal, args)))
 
 
 @register('-S')
@@ -830,21 +2701,33 @@ def do_show(journal, args):
     # type: (Journal, Namespace) -> None
     """Show entry contents.
 
+    Entry text is written straight to the output file descriptor, copied from
+    the cache file by the kernel when possible.
+
     Parameters:
         journal: The journal.
         args: The CLI arguments.
     """
-    entries = filter_entries(journal, args)
-    if not entries:
+
+    def _write_entries(fd):
+        # type: (int) -> None
+        with PHASES.start('output'):
+            for index, title in enumerate(chain([first_title], titles)):
+                if index:
+                    write_all(fd, b'\n\n')
+                journal.write_text(title, fd)
+
+    titles = iter(query_entries(journal, args).titles())
+    first_title = next(titles, None)
+    if first_title is None:
         return
-    text = '\n\n'.join(
-        entry.text for entry
-        in sort_entries(entries.values(), reverse=args.reverse)
-    )
     if stdout.isatty():
-        temp_file = Path(mkstemp(FILE_EXTENSION)[1]).expanduser().resolve()
-        with temp_file.open('w', encoding='utf-8') as fd:
-            fd.write(text)
+        temp_fd, temp_path = mkstemp(FILE_EXTENSION)
+        try:
+            _write_entries(temp_fd)
+        finally:
+            close(temp_fd)
+        temp_file = Path(temp_path).expanduser().resolve()
         chmod(temp_file, S_IRUSR)
         if fork():
             wait()
@@ -868,7 +2751,9 @@ def do_show(journal, args):
                 ))
             execvp(editor, vim_args)
     else:
-        print(text)
+        stdout.flush()
+        _write_entries(stdout.fileno())
+        write_all(stdout.fileno(), b'\n')
 
 
 @register('-W')
@@ -880,45 +2765,189 @@ def do_wording(journal, args):
         journal: The journal.
         args: The CLI arguments.
     """
-    journal_text = '\n'.join(
-        entry.text for entry in
-        filter_entries(journal, args, terms=None).values()
-    )
-    alpha_regex = re.compile("[a-z']", flags=re.IGNORECASE)
+    # the lookbehind only tries to match at the start of words
+    hyphen_regex = re.compile("(?<![a-z'])[a-z']+(?:-[a-z']+)+", flags=re.IGNORECASE)
+
+    def _is_alpha(char):
+        # type: (str) -> bool
+        return char == "'" or (char.isascii() and char.isalpha())
+
+    def _is_word_char(char):
+        # type: (str) -> bool
+        # the characters matched by \w
+        return char.isalnum() or char == '_'
+
+    entries = list(query_entries(journal, args, terms=None, limit=None))
     if args.terms:
-        phrases = set(['-'.join(args.terms),])
+        hyphenated = set(['-'.join(args.terms),])
     else:
-        hyphen_regex = re.compile("([a-z']+(-[a-z']+)+)", flags=re.IGNORECASE)
-        phrases = set(matches[0] for matches in hyphen_regex.finditer(journal_text))
-    matches = set(chain(*(
-        re.finditer(r'[ -]?'.join(phrase.split('-')), journal_text, flags=re.IGNORECASE)
-        for phrase in sorted(phrases)
-    )))
-    seen = set()
-    rows = []
-    for match in matches:
-        variant = match.group()
-        if args.icase:
-            variant = variant.lower()
-        if variant in seen:
-            continue
-        if args.whole_words:
-            if alpha_regex.match(journal_text[match.start() - 1]):
-                continue
-            if alpha_regex.match(journal_text[match.end()]):
+        hyphenated = set(chain.from_iterable(hyphen_regex.findall(entry.text) for entry in entries))
+    phrase_variants = PhraseVariants(set(phrase.lower() for phrase in hyphenated))
+    # a variant is every distinct match of a phrase, and is counted in every entry that contains
+    # it; like re.finditer, a phrase is only found again after the end of its last match, but
+    # is counted wherever it is contained. With -w, the match must not be part of a longer
+    # word, and is only counted in entries that contain it between word boundaries
+    found = set() # type: set[str]
+    variants = {} # type: dict[str, tuple[int, Title, Title]]
+    for entry in (entries if hyphenated else []):
+        text = entry.text
+        contained = set()
+        # the end of the last match found of each phrase
+        found_ends = {} # type: dict[re.Pattern[str], int]
+        for match in phrase_variants.finditer(text):
+            start, end = match.span()
+            is_found = start >= found_ends.get(match.re, 0)
+            if is_found:
+                found_ends[match.re] = end
+            variant = match.group()
+            if args.icase:
+                variant = variant.lower()
+            if not args.whole_words:
+                if is_found:
+                    found.add(variant)
+                contained.add(variant)
                 continue
-            term = r'\b' + re.escape(match.group()) + r'\b'
-        else:
-            term = re.escape(match.group())
-        entries = filter_entries(journal, args, terms=[term])
-        rows.append((variant, len(entries), min(entries).iso(), max(entries).iso()))
-        seen.add(variant)
+            before = text[start - 1] if start > 0 else ''
+            after = text[end] if end < len(text) else ''
+            if is_found and not _is_alpha(before) and not _is_alpha(after):
+                found.add(variant)
+            if (
+                _is_word_char(before) != _is_word_char(text[start])
+                and _is_word_char(text[end - 1]) != _is_word_char(after)
+            ):
+                contained.add(variant)
+        for variant in contained:
+            if variant in variants:
+                count, first, last = variants[variant]
+                variants[variant] = (count + 1, min(first, entry.title), max(last, entry.title))
+            else:
+                variants[variant] = (1, entry.title, entry.title)
+    rows = [
+        (variant, count, first.iso(), last.iso())
+        for variant, (count, first, last) in variants.items()
+        if variant in found
+    ]
     print_table(
-        sorted(rows, key=(lambda row: row[1])),
+        sorted(rows, key=(lambda row: (row[1], row[0]))),
         (['VARIANT', 'COUNT', 'FIRST', 'LAST'] if args.headers else []),
     )
 
 
+@register()
+def do_serve(journal, args):
+    # type: (Journal, Namespace) -> None
+    """Serve queries over a Unix socket.
+
+    The journal is kept in memory and updated whenever a journal file
+    changes. Each query is run in a forked process, which writes directly to
+    the stdout and stderr of the client.
+
+    Parameters:
+        journal: The journal.
+        args: The CLI arguments.
+    """
+    # pylint: disable = protected-access, too-many-statements
+    arg_parser = build_arg_parser(ArgumentParser())
+    file_stats = journal.file_stats
+    journal._read_date_index()
+    journal._read_word_index()
+    socket_file = journal.socket_file
+    socket_file.unlink(missing_ok=True)
+    # the connections of running queries, by process ID
+    queries = {} # type: dict[int, socket]
+    # the connections whose queries have not been received yet, by file descriptor
+    pending = {} # type: dict[int, socket]
+
+    def _reap_queries():
+        # type: () -> None
+        for pid, connection in list(queries.items()):
+            finished_pid, status = waitpid(pid, WNOHANG)
+            if finished_pid == 0:
+                continue
+            del queries[pid]
+            with connection:
+                connection.sendall(str(waitstatus_to_exitcode(status)).encode('utf-8'))
+
+    def _fork_query(message, fds):
+        # type: (bytes, list[int]) -> int
+        stdout.flush()
+        stderr.flush()
+        pid = fork()
+        if pid != 0:
+            for fd in fds:
+                close(fd)
+            return pid
+        status = 1
+        try:
+            set_wakeup_fd(old_wakeup_fd)
+            signal(SIGCHLD, old_handler)
+            # clients wait for their connection to close, so do not hold theirs
+            for other_connection in chain(queries.values(), pending.values()):
+                other_connection.close()
+            dup2(fds[0], stdout.fileno())
+            dup2(fds[1], stderr.fileno())
+            status = serve_query(arg_parser, args, journal, message)
+        except Exception: # pylint: disable = broad-except
+            print_exc()
+        finally:
+            stdout.flush()
+            stderr.flush()
+            exit_process(status)
+        return pid
+
+    # SIGCHLD writes to the wakeup socket, so finished queries are reaped while
+    # waiting for connections, and a slow query does not block other clients;
+    # accepted connections are also selected, so a slow client does not either
+    server = socket(AF_UNIX, SOCK_STREAM)
+    wakeup_socket, signal_socket = socketpair()
+    signal_socket.setblocking(False)
+    with server, wakeup_socket, signal_socket, DefaultSelector() as selector:
+        server.bind(str(socket_file))
+        server.listen()
+        selector.register(server, EVENT_READ)
+        selector.register(wakeup_socket, EVENT_READ)
+        old_handler = signal(SIGCHLD, lambda signum, frame: None)
+        old_wakeup_fd = set_wakeup_fd(signal_socket.fileno())
+        try:
+            while True:
+                for key, _ in selector.select():
+                    if key.fileobj is wakeup_socket:
+                        wakeup_socket.recv(4096)
+                        _reap_queries()
+                        continue
+                    if key.fileobj is server:
+                        connection, _ = server.accept()
+                        pending[connection.fileno()] = connection
+                        selector.register(connection, EVENT_READ)
+                        continue
+                    connection = pending.pop(key.fd)
+                    selector.unregister(connection)
+                    try:
+                        message, fds, _, _ = recv_fds(connection, 65536, 2)
+                    except OSError:
+                        connection.close()
+                        continue
+                    if len(fds) != 2:
+                        for fd in fds:
+                            close(fd)
+                        connection.close()
+                        continue
+                    if journal.file_stats != file_stats:
+                        journal.update_metadata()
+                        file_stats = journal.file_stats
+                        journal._read_date_index()
+                        journal._read_word_index()
+                    queries[_fork_query(message, fds)] = connection
+        except KeyboardInterrupt:
+            pass
+        finally:
+            set_wakeup_fd(old_wakeup_fd)
+            signal(SIGCHLD, old_handler)
+            for connection in chain(queries.values(), pending.values()):
+                connection.close()
+            socket_file.unlink(missing_ok=True)
+
+
 @register()
 def do_vimgrep(journal, args):
     # type: (Journal, Namespace) -> None
@@ -928,53 +2957,50 @@ def do_vimgrep(journal, args):
         journal: The journal.
         args: The CLI arguments.
     """
-    prefix_words = 3
-    suffix_words = 8
-    entries = filter_entries(journal, args)
-    if not args.terms:
-        args.terms.append('^.')
-    results = []
-    for entry in sort_entries(entries.values(), reverse=args.reverse):
-        lines = entry.text.splitlines()
+    prefix_regex = re.compile(r'(\S+ ){,3}\S*$')
+    suffix_regex = re.compile(r'^\S*( \S+){,8}')
+
+    def _entry_results(entry):
+        # type: (Entry) -> Generator[tuple[int, int, str], None, None]
+        line_starts = [0]
+        line_starts.extend(match.end() for match in re.finditer('\n', entry.text))
+        lines = entry.text.split('\n')
         entry_results = []
-        for term in args.terms:
-            if args.whole_words:
-                term = r'\b' + term + r'\b'
-            for match in re.finditer(term, entry.text, flags=args.icase):
-                prev_lines = ('\n' + entry.text[:match.start() + 1]).splitlines()
-                line_num = len(prev_lines) - 1
-                col_num = len(prev_lines[-1]) - 1
-                match_line = lines[line_num - 1]
-                prefix = re.search(
-                    r'(\S+ ){,' + str(prefix_words) + r'}\S*$',
-                    match_line[:col_num],
-                ).group()
-                suffix = re.search(
-                    r'^\S*( \S+){,' + str(suffix_words) + '}',
-                    match_line[col_num + len(match.group()):],
-                ).group()
-                match_line_num = entry.line_num + line_num - 1
-                match_col_num = col_num + 1
+        for term_regex in term_regexes:
+            for match in term_regex.finditer(entry.text):
+                line_index = bisect_right(line_starts, match.start()) - 1
+                col_num = match.start() - line_starts[line_index]
+                match_line = lines[line_index]
+                prefix = prefix_regex.search(match_line[:col_num]).group()
+                suffix = suffix_regex.search(match_line[col_num + len(match.group()):]).group()
                 entry_results.append((
-                    (match_line_num, match_col_num),
-                    entry.filepath,
-                    match_line_num,
-                    match_col_num,
-                    entry.title,
-                    f'{prefix}{match.group()}{suffix}'
+                    entry.line_num + line_index,
+                    col_num + 1,
+                    f'{prefix}{match.group()}{suffix}',
                 ))
-        results.extend(sorted(entry_results))
-    for _, path, line_num, col_num, title, preview in results:
-        if title.is_date:
-            label = title.iso()
+        yield from sorted(entry_results)
+
+    entries = query_entries(journal, args)
+    if not args.terms:
+        args.terms.append('^.')
+    term_regexes = SearchTerms(args.terms, args.icase, args.whole_words, multiline=False).regexes
+    for entry in entries:
+        if entry.title.is_date:
+            label = entry.title.iso()
         else:
-            label = str(title).upper()
-        print(':'.join([
-            f'{path}',
-            f'{line_num}',
-            f'{col_num}',
-            f'[{label}] {preview}',
-        ]))
+            label = str(entry.title).upper()
+        has_results = False
+        for line_num, col_num, preview in _entry_results(entry):
+            print(':'.join([
+                f'{entry.filepath}',
+                f'{line_num}',
+                f'{col_num}',
+                f'[{label}] {preview}',
+            ]))
+            has_results = True
+        if has_results:
+            with PHASES.start('output'):
+                stdout.flush()
 
 
 # CLI
@@ -1110,6 +3136,24 @@ def build_arg_parser(arg_parser):
         default='length',
         help='[G] set the node size attribute (default: %(default)s)',
     )
+    group.add_argument(
+        '--incremental',
+        action='store_true',
+        help='[A] only archive files that changed since the last archive',
+    )
+    group.add_argument(
+        '--list',
+        dest='list_members',
+        action='store_true',
+        help='[U] list the members of the archives instead of extracting them',
+    )
+    group.add_argument(
+        '-n', '--limit', '--head',
+        dest='limit',
+        type=int,
+        metavar='N',
+        help='[LS] stop after N matching entries; also applies to --vimgrep',
+    )
 
     group = arg_parser.add_argument_group('MISCELLANEOUS OPTIONS')
     group.add_argument(
@@ -1118,6 +3162,19 @@ def build_arg_parser(arg_parser):
         action='store_false',
         help='do not log command',
     )
+    group.add_argument(
+        '--profile',
+        action='store_true',
+        help=f'print the time spent in each phase; can also be set with {PROFILE_ENV_VAR}=1',
+    )
+    group.add_argument(
+        '--profile-output',
+        metavar='FILE',
+        help=(
+            'also write cProfile statistics to FILE; implies --profile; '
+            f'can also be set with {PROFILE_ENV_VAR}=FILE'
+        ),
+    )
 
     return arg_parser
 
@@ -1170,10 +3227,10 @@ def process_args(arg_parser, args):
     Returns:
         Namespace: The CLI arguments, augmented.
     """
+    if args.operation.__name__ == 'do_unarchive' and not args.terms:
+        arg_parser.error('-U requires one or more archives')
     if args.operation.__name__ == 'do_wording':
         args.terms = list(chain(*(term.split('-') for term in args.terms)))
-    elif args.operation.__name__ == 'do_index':
-        args.use_cache = False
     if args.date_spec is None:
         args.date_ranges = None
     else:
@@ -1195,6 +3252,8 @@ def process_args(arg_parser, args):
                 )
             date_ranges.append((start_date, end_date))
         args.date_ranges = date_ranges
+    if args.limit is not None and args.limit < 1:
+        arg_parser.error(f'argument -n/--limit: "{args.limit}" should be a positive number')
     args.directory = args.directory.expanduser().resolve()
     args.ignores = set(path.expanduser().resolve() for path in args.ignores)
     return args
@@ -1210,22 +3269,120 @@ def parse_args(arg_parser, args):
     """
     if arg_parser is None:
         arg_parser = build_arg_parser(ArgumentParser())
-    args = process_args(arg_parser, args)
+    with PHASES.start('arguments'):
+        args = process_args(arg_parser, args)
     if args.operation.__name__ in ('do_archive', 'do_unarchive'):
         journal = None
     else:
-        journal = Journal(args.directory, use_cache=args.use_cache, ignores=args.ignores)
-        if len(journal) == 0:
-            arg_parser.error(f'no journal entries found in {args.directory}')
+        with PHASES.start('load'):
+            journal = Journal(
+                args.directory,
+                use_cache=args.use_cache,
+                ignores=args.ignores,
+                # -I updates the metadata itself
+                auto_update=(args.operation.__name__ != 'do_index'),
+            )
+    run_operation(arg_parser, args, journal)
+
+
+def run_operation(arg_parser, args, journal):
+    # type: (ArgumentParser, Namespace, Optional[Journal]) -> None
+    """Run the operation on the journal.
+
+    Parameters:
+        arg_parser: The CLI argument parser.
+        args: The processed CLI arguments.
+        journal: The journal, or None if the operation does not need one.
+    """
+    if journal is not None and len(journal) == 0 and args.operation.__name__ != 'do_index':
+        arg_parser.error(f'no journal entries found in {args.directory}')
     if args.log and args.operation.__name__ in ('do_show', 'do_list', 'do_vimgrep'):
         log_search(arg_parser, args, journal)
-    args.operation(journal, args)
+    with PHASES.start('operation'):
+        args.operation(journal, args)
     try:
-        stdout.flush()
+        with PHASES.start('output'):
+            stdout.flush()
     except BrokenPipeError:
         pass
 
 
+def serve_query(arg_parser, args, journal, message):
+    # type: (ArgumentParser, Namespace, Journal, bytes) -> int
+    """Run a query from a client of the journal server.
+
+    Parameters:
+        arg_parser: The CLI argument parser.
+        args: The CLI arguments of the server.
+        journal: The journal.
+        message: The query, as the JSON-encoded CLI arguments of the client.
+
+    Returns:
+        int: The exit status of the query.
+    """
+    try:
+        query_args = arg_parser.parse_args(json_from_str(message.decode('utf-8')))
+        query_args.directory = args.directory
+        query_args = process_args(arg_parser, query_args)
+        if query_args.operation.__name__ not in SERVED_OPERATIONS:
+            arg_parser.error(f'{query_args.operation.__name__} cannot be served')
+        run_operation(arg_parser, query_args, journal)
+    except SystemExit as err:
+        stdout.flush()
+        stderr.flush()
+        return err.code if isinstance(err.code, int) else 1
+    return 0
+
+
+def query_server(args, cli_args):
+    # type: (Namespace, list[str]) -> Optional[int]
+    """Run the query on a journal server, if one is running.
+
+    The query is only left to run in-process if it could not be sent to the
+    server. Once it is sent, the server may have written output, so a missing
+    exit status is reported as a failure instead.
+
+    Parameters:
+        args: The CLI arguments.
+        cli_args: The unparsed CLI arguments.
+
+    Returns:
+        int: The exit status of the query, or None if the query was not served.
+    """
+    if (
+        args.operation.__name__ not in SERVED_OPERATIONS
+        or args.ignores
+        or not args.use_cache
+        or (args.operation.__name__ == 'do_show' and stdout.isatty())
+    ):
+        return None
+    socket_file = args.directory.expanduser().resolve() / SOCKET_FILENAME
+    if not socket_file.is_socket():
+        return None
+    with socket(AF_UNIX, SOCK_STREAM) as client:
+        try:
+            client.connect(str(socket_file))
+            stdout.flush()
+            send_fds(
+                client,
+                [json_to_str(cli_args).encode('utf-8')],
+                [stdout.fileno(), stderr.fileno()],
+            )
+        except OSError:
+            return None
+        response = b''
+        try:
+            while chunk := client.recv(1024):
+                response += chunk
+        except OSError:
+            pass
+    try:
+        return int(response)
+    except ValueError:
+        print('the journal server did not report the status of the query', file=stderr)
+        return 1
+
+
 def log_search(arg_parser, args, journal):
     # type: (ArgumentParser, Namespace, Journal) -> None
     # pylint: disable = protected-access
@@ -1273,12 +3430,57 @@ def log_search(arg_parser, args, journal):
         fd.write(f'{datetime.today().isoformat(" ")}\t{log_args} -- {terms}\n')
 
 
+def log_profile(args):
+    # type: (Namespace) -> None
+    """Print the phase timings of a run, and append them to the search log.
+
+    Parameters:
+        args: The CLI arguments.
+    """
+    timings = [(phase, PHASES.timings[phase]) for phase in PROFILE_PHASES]
+    timings.append(('total', sum(PHASES.timings.values())))
+    summary = ', '.join(f'{phase} {seconds:.3f}s' for phase, seconds in timings)
+    print(f'profile: {summary}', file=stderr)
+    log_file = args.directory.expanduser().resolve() / '.log'
+    if args.log and log_file.exists():
+        with log_file.open('a') as fd:
+            operation = args.operation.__name__
+            fd.write(f'{datetime.today().isoformat(" ")}\tprofile {operation}: {summary}\n')
+
+
 def main():
     # type: () -> None
     """Provide a CLI entry point."""
+    start_time = perf_counter()
     arg_parser = build_arg_parser(ArgumentParser())
     args = arg_parser.parse_args()
-    parse_args(arg_parser, args)
+    if not args.profile and args.profile_output is None:
+        # an empty or 0 value turns profiling off, 1 turns it on, and anything else is a file
+        profile_value = environ.get(PROFILE_ENV_VAR, '')
+        if profile_value not in ('', '0', '1'):
+            args.profile_output = profile_value
+        args.profile = profile_value not in ('', '0')
+    if args.profile_output is not None:
+        args.profile = True
+    if not args.profile:
+        status = query_server(args, argv[1:])
+        if status is None:
+            parse_args(arg_parser, args)
+        else:
+            sys_exit(status)
+        return
+    PHASES.enabled = True
+    PHASES.timings['arguments'] += perf_counter() - start_time
+    profiler = None if args.profile_output is None else Profile()
+    try:
+        if profiler is None:
+            parse_args(arg_parser, args)
+        else:
+            profiler.runcall(parse_args, arg_parser, args)
+    finally:
+        if profiler is not None:
+            profiler.dump_stats(args.profile_output)
+        log_profile(args)
 
 
 if __name__ == '__main__':